@@ -5,7 +5,7 @@ Real-time metrics, user management, revenue tracking
 import json
 import logging
 from datetime import datetime, timedelta
-from database import get_db
+from database import get_db, transaction
 
 logger = logging.getLogger(__name__)
 
@@ -84,24 +84,25 @@ def get_user_management():
 
 def upgrade_user_to_premium(user_id):
     """Manually upgrade user to premium (for testing/support)."""
-    db = get_db()
-    db.execute("UPDATE users SET tier='premium' WHERE user_id=?", (user_id,))
-    db.execute(
-        "INSERT INTO subscriptions (user_id, tier, started_at) VALUES (?, ?, ?)",
-        (user_id, 'premium', datetime.now().isoformat())
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute("UPDATE users SET tier='premium' WHERE user_id=?", (user_id,))
+        db.execute(
+            "INSERT INTO subscriptions (user_id, tier, started_at) VALUES (?, ?, ?)",
+            (user_id, 'premium', datetime.now().isoformat())
+        )
     logger.info(f"User {user_id} upgraded to premium")
     return {"success": True, "user_id": user_id, "tier": "premium"}
 
 
 def get_api_health():
     """Check system health."""
+    quota = None
     try:
-        from tm_api import search_events
+        from tm_api import search_events, quota_status, resilience_status
         # Quick API test
         events = search_events("test", size=1)
         api_status = "healthy" if events else "degraded"
+        quota = {**quota_status(), **resilience_status()}
     except Exception as e:
         api_status = "down"
         logger.error(f"API health check failed: {e}")
@@ -116,7 +117,8 @@ def get_api_health():
             "ticketmaster_api": api_status,
             "database": db_status,
             "watcher_job": "running"  # Could check last run time
-        }
+        },
+        "ticketmaster_quota": quota
     }
 
 
@@ -1,18 +1,27 @@
 """
 TicketWatch Alert Sender
-Sends WhatsApp alerts when tickets are found
+Queues WhatsApp alerts in the alert_outbox table, which OpenClaw (or any
+dispatcher) polls with `python alerts.py claim` and acknowledges
 """
 import json
+import socket
 import logging
-from pathlib import Path
-from config import OPENCLAW_WORKSPACE
+from config import (
+    ALERT_OUTBOX_CLAIM_BATCH, ALERT_OUTBOX_LEASE_SECONDS, ALERT_OUTBOX_MAX_ATTEMPTS,
+    ALERT_OUTBOX_RETRY_DELAY, ALERT_OUTBOX_KEEP_DAYS
+)
+from database import (
+    enqueue_alert, claim_alerts, ack_alerts, nack_alert, purge_alert_outbox, get_outbox_stats
+)
 
 logger = logging.getLogger(__name__)
 
 
 def send_alert(user_id, phone, event_name, venue, date, current_price, max_price, quantity, buy_url):
     """
-    Send a WhatsApp alert via OpenClaw when tickets are found.
+    Queue a WhatsApp alert via OpenClaw when tickets are found.
+    The watcher records alerts with database.record_alert instead, so the
+    message is queued in the same transaction as the alert.
     
     Returns: {"success": bool, "message": str}
     """
@@ -56,33 +65,13 @@ def send_whatsapp_via_openclaw(user_id, message):
     """
     Send a WhatsApp message via OpenClaw.
     
-    This integrates with your existing OpenClaw setup.
-    In production, this could use:
-    1. OpenClaw's API
-    2. Direct WhatsApp Business API
-    3. A webhook/callback
-    
-    For MVP, we'll log it and assume you can receive via WhatsApp directly.
+    The message goes into the alert outbox; OpenClaw claims it, delivers
+    it and acks it (see the CLI below), and it is retried until then.
     """
     try:
-        # Check if we can use OpenClaw's message sending
-        # For now, just log and return success
-        # In production, implement actual WhatsApp sending here
-        
         logger.info(f"WhatsApp to {user_id}:\n{message}")
-
-        # Option 1: Write to a queue file that OpenClaw polls
-        queue_file = Path.home() / "ticketwatch" / "data" / "alert_queue.jsonl"
-        queue_file.parent.mkdir(parents=True, exist_ok=True)
-
-        with open(queue_file, "a") as f:
-            f.write(json.dumps({
-                "timestamp": __import__("datetime").datetime.now().isoformat(),
-                "user_id": user_id,
-                "message": message
-            }) + "\n")
-
-        return {"success": True}
+        outbox_id = enqueue_alert(user_id, message)
+        return {"success": True, "id": outbox_id}
 
     except Exception as e:
         logger.error(f"Error sending WhatsApp: {e}")
@@ -110,33 +99,60 @@ def send_via_whatsapp_business_api(phone, message):
     pass
 
 
-if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
-
-    # Test alert formatting
-    test_alert = format_alert_message(
-        event_name="Fred Again",
-        venue="3Arena Dublin",
-        date="2026-03-15",
-        current_price=75.0,
-        max_price=80.0,
-        quantity=2,
-        buy_url="https://www.ticketmaster.ie/fred-again-dublin"
-    )
+def main():
+    """
+    Outbox CLI for dispatchers. Each command prints JSON:
+      claim [--worker W] [--limit N]   one pending message per line
+      ack ID [ID ...] [--worker W]     delivered
+      nack ID [--error TEXT] [--worker W]  not delivered; retry later
+      stats | purge
+    With no command, prints a sample alert.
+    """
+    import argparse
+    from config import LOG_LEVEL, LOG_FORMAT
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+    parser = argparse.ArgumentParser(description="TicketWatch alert outbox")
+    owner = argparse.ArgumentParser(add_help=False)
+    owner.add_argument("--worker", default=socket.gethostname(), help="Lease owner name (default hostname)")
+    commands = parser.add_subparsers(dest="command")
+    claim = commands.add_parser("claim", parents=[owner], help="Lease pending messages")
+    claim.add_argument("--limit", type=int, default=ALERT_OUTBOX_CLAIM_BATCH)
+    ack = commands.add_parser("ack", parents=[owner], help="Mark messages delivered")
+    ack.add_argument("ids", type=int, nargs="+")
+    nack = commands.add_parser("nack", parents=[owner], help="Return a message for retry")
+    nack.add_argument("id", type=int)
+    nack.add_argument("--error", default=None)
+    commands.add_parser("stats", help="Message counts by state")
+    commands.add_parser("purge", help="Delete old sent and failed messages")
+    args = parser.parse_args()
+
+    if args.command == "claim":
+        for message in claim_alerts(args.worker, args.limit, ALERT_OUTBOX_LEASE_SECONDS,
+                                    ALERT_OUTBOX_MAX_ATTEMPTS):
+            print(json.dumps(message, ensure_ascii=False))
+    elif args.command == "ack":
+        print(json.dumps({"acked": ack_alerts(args.worker, args.ids)}))
+    elif args.command == "nack":
+        state = nack_alert(args.worker, args.id, args.error, ALERT_OUTBOX_RETRY_DELAY,
+                           ALERT_OUTBOX_MAX_ATTEMPTS)
+        print(json.dumps({"id": args.id, "state": state}))
+    elif args.command == "stats":
+        print(json.dumps(get_outbox_stats()))
+    elif args.command == "purge":
+        print(json.dumps({"purged": purge_alert_outbox(ALERT_OUTBOX_KEEP_DAYS)}))
+    else:
+        print("Sample alert:")
+        print(format_alert_message(
+            event_name="Fred Again",
+            venue="3Arena Dublin",
+            date="2026-03-15",
+            current_price=75.0,
+            max_price=80.0,
+            quantity=2,
+            buy_url="https://www.ticketmaster.ie/fred-again-dublin"
+        ))
 
-    print("Sample alert:")
-    print(test_alert)
-
-    # Test sending (won't actually send, just logs)
-    # result = send_alert(
-    #     user_id="+353858536569",
-    #     phone="+353858536569",
-    #     event_name="Fred Again",
-    #     venue="3Arena Dublin",
-    #     date="2026-03-15",
-    #     current_price=75.0,
-    #     max_price=80.0,
-    #     quantity=2,
-    #     buy_url="https://www.ticketmaster.ie/fred-again-dublin"
-    # )
-    # print(f"Result: {result}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+TicketWatch Response Caches
+Bounded in-process cache for Ticketmaster responses, plus an on-disk tier
+shared by every handler and watcher process
+"""
+import json
+import time
+import random
+import logging
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries also expire after `ttl` seconds.
+    None is never cached, so a None from get() always means a miss.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60, name=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value, ttl=None):
+        if value is None:
+            return
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None."""
+        with self._lock:
+            if key is None:
+                self._data.clear()
+            else:
+                self._data.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
+
+class DiskCache:
+    """
+    JSON values in a small SQLite file with per-entry expiry and LRU
+    eviction beyond `maxsize` entries. Safe for concurrent processes (WAL,
+    busy timeout); a failed read is treated as a miss so the cache can
+    never break a request. Hits only write (to refresh the LRU time) once
+    touch_fraction of the entry's remaining life has passed since the last
+    refresh, and a failed refresh still returns the hit.
+    """
+
+    def __init__(self, path, maxsize=20000, evict_every=100, touch_fraction=0.1):
+        self.path = str(path)
+        self.maxsize = maxsize
+        self.evict_every = evict_every
+        self.touch_fraction = touch_fraction
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=2)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+            CREATE TABLE IF NOT EXISTS cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_cache_accessed ON cache(accessed_at);
+            """)
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        entry = self.get_entry(key)
+        return entry[0] if entry else None
+
+    def get_entry(self, key):
+        """Return (value, seconds_left) for a live key, else None."""
+        now = time.time()
+        try:
+            conn = self._conn()
+            row = conn.execute(
+                "SELECT value, expires_at, accessed_at FROM cache WHERE key=? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug(f"Disk cache read failed for {key}: {e}")
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        value, expires_at, accessed_at = row
+        if now - accessed_at > (expires_at - accessed_at) * self.touch_fraction:
+            self._touch(key, now)
+        return json.loads(value), expires_at - now
+
+    def _touch(self, key, now):
+        """Refresh a hit's LRU time; best effort (skipped if the file is busy)."""
+        try:
+            conn = self._conn()
+            conn.execute("UPDATE cache SET accessed_at=? WHERE key=?", (now, key))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.debug(f"Disk cache touch failed for {key}: {e}")
+            self._rollback()
+
+    def set(self, key, value, ttl):
+        self.set_many([(key, value, ttl)])
+
+    def set_many(self, items):
+        """Write (key, value, ttl) items in one transaction; None values are skipped."""
+        now = time.time()
+        rows = [
+            (key, json.dumps(value, separators=(",", ":")), now + ttl, now)
+            for key, value, ttl in items if value is not None
+        ]
+        if not rows:
+            return
+        try:
+            conn = self._conn()
+            conn.executemany(
+                "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+            if random.randrange(self.evict_every) < len(rows):
+                self.evict()
+        except sqlite3.Error as e:
+            logger.debug(f"Disk cache write failed for {len(rows)} keys: {e}")
+            self._rollback()
+
+    def _rollback(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                pass
+
+    def evict(self):
+        """Drop expired entries, then the least recently used beyond maxsize."""
+        conn = self._conn()
+        conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+        conn.execute(
+            """DELETE FROM cache WHERE key IN (
+                   SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?
+               )""",
+            (self.maxsize,)
+        )
+        conn.commit()
+
+    def invalidate(self, key=None):
+        """Drop one key, or everything when key is None."""
+        try:
+            conn = self._conn()
+            if key is None:
+                conn.execute("DELETE FROM cache")
+            else:
+                conn.execute("DELETE FROM cache WHERE key=?", (key,))
+            conn.commit()
+        except sqlite3.Error as e:
+            logger.warning(f"Disk cache invalidation failed: {e}")
+
+    def stats(self):
+        try:
+            size = self._conn().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        except sqlite3.Error:
+            size = None
+        lookups = self.hits + self.misses
+        return {
+            "size": size,
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
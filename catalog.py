@@ -0,0 +1,159 @@
+"""
+TicketWatch Event Catalog
+Local mirror of upcoming Irish Ticketmaster events with full-text search,
+so interactive searches are answered from SQLite in milliseconds
+"""
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+from config import TM_CATALOG_SYNC_DAYS, TM_CATALOG_MAX_AGE_HOURS
+from database import get_db, transaction
+from models import Event
+
+logger = logging.getLogger(__name__)
+
+# Events written per transaction while syncing
+_SYNC_CHUNK = 500
+
+_FIELDS = Event.__slots__
+
+# Set once we know whether the FTS5 index exists
+_fts5 = None
+
+
+def _has_fts(db):
+    """Whether the catalog_fts index exists (created by migration 5 when FTS5 is available)."""
+    global _fts5
+    if _fts5 is None:
+        _fts5 = db.execute(
+            "SELECT 1 FROM sqlite_master WHERE type='table' AND name='catalog_fts'"
+        ).fetchone() is not None
+    return _fts5
+
+
+def upsert_events(events, synced_at=None):
+    """Store Events in the catalog and its search index."""
+    synced_at = synced_at or datetime.now().isoformat()
+    rows = [(*(getattr(event, field) for field in _FIELDS), synced_at) for event in events]
+
+    fts = _has_fts(get_db())
+    with transaction() as db:
+        db.executemany(
+            f"INSERT OR REPLACE INTO catalog_events ({', '.join(_FIELDS)}, synced_at) "
+            f"VALUES ({', '.join('?' * (len(_FIELDS) + 1))})",
+            rows
+        )
+        if fts:
+            db.executemany("DELETE FROM catalog_fts WHERE event_id=?", [(row[0],) for row in rows])
+            db.executemany(
+                "INSERT INTO catalog_fts (event_id, name, venue, city) VALUES (?, ?, ?, ?)",
+                [(event.id, event.name or "", event.venue or "", event.city or "") for event in events]
+            )
+    return len(rows)
+
+
+def search(query, city=None, limit=10):
+    """
+    Upcoming catalog events matching every word of the query (prefix
+    match on name, venue and city), optionally in one city.
+    Returns Events, best first.
+    """
+    words = [w for w in "".join(c if c.isalnum() else " " for c in query.lower()).split() if w]
+    if not words:
+        return []
+    today = datetime.now().strftime("%Y-%m-%d")
+    city_clause = " AND c.city = ? COLLATE NOCASE" if city else ""
+    city_args = (city,) if city else ()
+    columns = ", ".join(f"c.{field}" for field in _FIELDS)
+    db = get_db()
+
+    if _has_fts(db):
+        match = " ".join(f'"{w}"*' for w in words)
+        rows = db.execute(
+            f"""SELECT {columns} FROM catalog_fts f JOIN catalog_events c ON c.id = f.event_id
+               WHERE catalog_fts MATCH ? AND c.date >= ?{city_clause}
+               ORDER BY bm25(catalog_fts), c.date LIMIT ?""",
+            (match, today, *city_args, limit)
+        ).fetchall()
+    else:
+        where = " AND ".join("(c.name || ' ' || c.venue || ' ' || c.city) LIKE ?" for _ in words)
+        rows = db.execute(
+            f"""SELECT {columns} FROM catalog_events c
+                WHERE {where} AND c.date >= ?{city_clause}
+                ORDER BY c.date LIMIT ?""",
+            (*[f"%{w}%" for w in words], today, *city_args, limit)
+        ).fetchall()
+    return [Event(*row) for row in rows]
+
+
+def last_synced_at():
+    """When the catalog last stored events from a sync (None if never)."""
+    db = get_db()
+    row = db.execute("SELECT MAX(synced_at) AS synced FROM catalog_events").fetchone()
+    return row["synced"] if row else None
+
+
+def is_fresh():
+    """True if the catalog was synced within TM_CATALOG_MAX_AGE_HOURS."""
+    synced = last_synced_at()
+    if not synced:
+        return False
+    return datetime.now() - datetime.fromisoformat(synced) < timedelta(hours=TM_CATALOG_MAX_AGE_HOURS)
+
+
+def sync_catalog():
+    """
+    Stream every upcoming TM_COUNTRY_CODE event (TM_CATALOG_SYNC_DAYS
+    ahead) into the catalog, _SYNC_CHUNK events per write. Events a
+    complete sync no longer sees are dropped; a sync that failed or was
+    truncated by the Discovery API paging limit removes nothing.
+    """
+    from tm_api import iter_events, PRIORITY_BACKGROUND
+
+    started = datetime.now().isoformat()
+    now = datetime.now(timezone.utc).replace(microsecond=0)
+    events = iter_events(start=now, end=now + timedelta(days=TM_CATALOG_SYNC_DAYS),
+                         priority=PRIORITY_BACKGROUND)
+    total = 0
+    complete = True
+    try:
+        while True:
+            chunk = list(islice(events, _SYNC_CHUNK))
+            if not chunk:
+                break
+            total += upsert_events(chunk, synced_at=started)
+    except Exception as e:
+        logger.error(f"Catalog sync failed after {total} events: {e}")
+        complete = False
+    if events.truncated:
+        # Some window ran past the paging limit: events we never reached aren't stale
+        complete = False
+
+    if complete:
+        fts = _has_fts(get_db())
+        with transaction() as db:
+            stale = [row["id"] for row in db.execute(
+                "SELECT id FROM catalog_events WHERE synced_at < ?", (started,)
+            )]
+            db.executemany("DELETE FROM catalog_events WHERE id=?", [(i,) for i in stale])
+            if fts:
+                db.executemany("DELETE FROM catalog_fts WHERE event_id=?", [(i,) for i in stale])
+        logger.info(f"Catalog sync complete: {total} events, {len(stale)} removed")
+    else:
+        logger.warning(f"Catalog sync incomplete: {total} events stored, nothing removed")
+    return {"events": total, "complete": complete}
+
+
+if __name__ == "__main__":
+    import sys
+    from config import LOG_LEVEL, LOG_FORMAT
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        print(json.dumps(sync_catalog()))
+    elif len(sys.argv) > 1:
+        for event in search(" ".join(sys.argv[1:])):
+            print(event.id, event.name, event.date)
+    else:
+        print("Usage: python catalog.py sync | <search query>")
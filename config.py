@@ -13,12 +13,58 @@ LOGS_DIR.mkdir(exist_ok=True)
 
 # Database
 DB_PATH = DATA_DIR / "ticketwatch.db"
+DB_STATEMENT_CACHE = 256  # Prepared statements kept per connection
+DB_JOURNAL_MODE = "WAL"  # Readers (handlers, dashboard) and the watcher's writes don't block each other
+DB_SYNCHRONOUS = "NORMAL"  # Safe with WAL; FULL also syncs every commit
+DB_BUSY_TIMEOUT_MS = 5000  # Wait this long for a lock before "database is locked"
+DB_CACHE_SIZE_KB = 16384  # Page cache per connection
+DB_MMAP_SIZE = 256 * 1024 * 1024  # bytes of the file read through mmap (0 = off)
+DB_CHECKPOINT_INTERVAL = 30  # seconds between background WAL checkpoints (daemon)
+DB_CHECKPOINT_TRUNCATE_PAGES = 10000  # Truncate the WAL once a checkpoint finds it this big
 
 # Ticketmaster API
 TM_API_KEY = os.getenv("TICKETMASTER_API_KEY", "cQvA7GxtDil8OZsDICk9Vm0I0n5iJPtN")
 TM_BASE_URL = "https://app.ticketmaster.com/discovery/v2"
 TM_COUNTRY_CODE = "IE"
 TM_CHECK_TIMEOUT = 10  # seconds
+TM_RATE_LIMIT_PER_SECOND = 5  # Discovery API default
+TM_DAILY_QUOTA = 5000  # Discovery API default calls/day
+TM_INTERACTIVE_RESERVE = 0.1  # Share of the daily quota background polling can't touch
+TM_QUOTA_WAIT = 30  # seconds a call may wait for a rate-limit token
+TM_POOL_SIZE = 8  # Keep-alive connections; at least WATCHER_CONCURRENCY
+TM_ASYNC_POOL_SIZE = 32  # Requests in flight per event loop (tm_async); still paced by the quota
+TM_EVENT_CACHE_TTL = 60  # seconds an event lookup is reused
+TM_EVENT_CACHE_SIZE = 2048
+TM_SEARCH_CACHE_TTL = 300  # seconds a keyword search is reused
+TM_SEARCH_CACHE_SIZE = 256
+TM_DISK_CACHE_ENABLED = True  # Shared across processes (handler runs one per message)
+TM_DISK_CACHE_PATH = DATA_DIR / "tm_cache.db"
+TM_DISK_CACHE_SIZE = 20000  # entries
+TM_BULK_BATCH_SIZE = 50  # Event ids per bulk events.json request
+TM_BULK_MAX_ID_CHARS = 1500  # Keeps bulk request URLs well under common length limits
+TM_VALIDATOR_TTL = 86400  # seconds ETag/Last-Modified validators are kept for conditional polls
+
+# Ticketmaster resilience (retries, circuit breaker, hedging)
+TM_RETRY_ATTEMPTS = 3  # Total tries for timeouts, 429s and 5xx
+TM_RETRY_BASE_DELAY = 0.5  # seconds; backoff doubles per retry, with full jitter
+TM_RETRY_MAX_DELAY = 4.0
+TM_BREAKER_FAILURE_RATE = 0.5  # Open the circuit at this failure rate...
+TM_BREAKER_MIN_CALLS = 10  # ...over at least this many calls...
+TM_BREAKER_WINDOW = 30  # ...in the last N seconds
+TM_BREAKER_COOLDOWN = 30  # seconds to fail fast before a trial call
+TM_HEDGE_ENABLED = False  # Send a second request when one runs past the latency percentile
+TM_HEDGE_PERCENTILE = 95
+
+# Local event catalog (python catalog.py sync)
+TM_CATALOG_ENABLED = True  # Answer searches from the catalog while it is fresh
+TM_CATALOG_SYNC_DAYS = 365  # How far ahead the sync mirrors events
+TM_CATALOG_MAX_AGE_HOURS = 26  # Older than this and searches go back to the live API
+
+# Price history (price_history.py; raw samples roll up to hourly, then daily)
+PRICE_HISTORY_ENABLED = True  # Record every watcher observation
+PRICE_HISTORY_RAW_DAYS = 14  # Keep raw samples this long
+PRICE_HISTORY_HOURLY_DAYS = 180  # Keep hourly rollups this long
+PRICE_HISTORY_DAILY_DAYS = 1095  # Keep daily rollups this long
 
 # OpenClaw (for WhatsApp integration)
 OPENCLAW_WORKSPACE = Path.home() / ".openclaw" / "workspace"
@@ -26,6 +72,24 @@ OPENCLAW_WORKSPACE = Path.home() / ".openclaw" / "workspace"
 # Check intervals
 CHECK_INTERVAL_MINUTES = 5  # How often cron runs
 
+# Adaptive poll scheduling (per-event next-check times)
+SCHEDULER_MIN_INTERVAL_MINUTES = 1
+SCHEDULER_MAX_INTERVAL_MINUTES = 60
+SCHEDULER_HOT_MINUTES = 60  # Poll faster for this long after a status/price change
+
+# Watcher concurrency
+WATCHER_CONCURRENCY = 8  # Parallel event fetches per cycle (1 = sequential)
+WATCHER_CYCLE_TIMEOUT = 240  # seconds; stop waiting on fetches after this
+
+# Daemon mode (watcher.py --daemon)
+DAEMON_MIN_SLEEP = 5  # seconds between cycles, at least
+DAEMON_MAX_SLEEP = 60  # seconds; wake this often to pick up new watches
+DAEMON_HOUSEKEEPING_INTERVAL = 3600  # seconds between price history rollups and outbox purges
+
+# Watch leasing (lets several watcher processes share the watches table)
+WATCHER_LEASE_BATCH = 400  # Events claimed per lease (fetched TM_BULK_BATCH_SIZE per request)
+WATCHER_LEASE_SECONDS = 300  # Leases from a crashed worker expire after this
+
 # Pricing tiers
 FREE_TIER_MAX_WATCHES = 1
 PREMIUM_TIER_PRICE_EUR = 4.99  # Monthly subscription
@@ -34,6 +98,13 @@ PREMIUM_TIER_PRICE_EUR = 4.99  # Monthly subscription
 ALERT_BATCH_SIZE = 5  # Max alerts per batch send
 ALERT_COOLDOWN_MINUTES = 60  # Don't spam same user
 
+# Alert outbox (python alerts.py claim/ack/nack; polled by OpenClaw)
+ALERT_OUTBOX_CLAIM_BATCH = 20  # Messages handed out per claim
+ALERT_OUTBOX_LEASE_SECONDS = 120  # Unacked messages are handed out again after this
+ALERT_OUTBOX_MAX_ATTEMPTS = 5  # Then the message is marked failed
+ALERT_OUTBOX_RETRY_DELAY = 30  # seconds before the first retry; doubles per attempt
+ALERT_OUTBOX_KEEP_DAYS = 30  # Sent and failed messages are purged after this
+
 # Demo/Testing mode (auto-detect: True if no API key set)
 DEMO_MODE = not bool(TM_API_KEY) or TM_API_KEY == ""
 
@@ -1,34 +1,174 @@
 """
 TicketWatch Database Schema and Helpers
 """
+import os
+import time
 import sqlite3
 import logging
-from datetime import datetime
-from config import DB_PATH
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from config import (
+    DB_PATH, DB_STATEMENT_CACHE, DB_JOURNAL_MODE, DB_SYNCHRONOUS, DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB, DB_MMAP_SIZE, DB_CHECKPOINT_INTERVAL, DB_CHECKPOINT_TRUNCATE_PAGES
+)
 
 logger = logging.getLogger(__name__)
 
 
+# One connection per thread (and process), reused by every helper
+_local = threading.local()
+_migrated = set()
+_migrate_lock = threading.Lock()
+_checkpointer = None
+
+
 def get_db():
-    """Get database connection."""
-    conn = sqlite3.connect(str(DB_PATH))
-    conn.row_factory = sqlite3.Row
-    conn.execute("PRAGMA foreign_keys = ON")
-    _init_schema(conn)
+    """
+    Get this thread's database connection, opening it on first use.
+    Connections keep a prepared-statement cache (DB_STATEMENT_CACHE), use
+    the DB_* journal/sync/cache settings, and are reopened after a fork or
+    a change of DB_PATH. A transaction a failed helper left open outside
+    transaction() is rolled back, so one error can't wedge the thread.
+    """
+    key = (os.getpid(), str(DB_PATH))
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.key == key and conn.in_transaction and not getattr(_local, "depth", 0):
+        logger.warning("Rolling back a transaction left open on this thread's connection")
+        conn.rollback()
+    if conn is None or _local.key != key:
+        conn = sqlite3.connect(str(DB_PATH), cached_statements=DB_STATEMENT_CACHE)
+        conn.row_factory = sqlite3.Row
+        try:
+            _configure(conn)
+            if key not in _migrated:
+                with _migrate_lock:
+                    if key not in _migrated:
+                        migrate(conn)
+                        _migrated.add(key)
+        except Exception:
+            # Not cached, so the next get_db() retries the migration
+            conn.close()
+            raise
+        _local.conn, _local.key = conn, key
     return conn
 
 
-def _init_schema(conn):
-    """Initialize database tables if they don't exist."""
-    conn.executescript("""
+@contextmanager
+def transaction():
+    """
+    This thread's connection inside a write transaction (BEGIN IMMEDIATE):
+    committed when the block finishes, rolled back if anything in it raises.
+    Nested blocks join the outermost one.
+    """
+    db = get_db()
+    depth = getattr(_local, "depth", 0)
+    if depth:
+        _local.depth = depth + 1
+        try:
+            yield db
+        finally:
+            _local.depth = depth
+        return
+    try:
+        db.execute("BEGIN IMMEDIATE")
+        _local.depth = 1
+        yield db
+        db.commit()
+    except BaseException:
+        db.rollback()
+        raise
+    finally:
+        _local.depth = 0
+
+
+def _configure(conn):
+    conn.execute(f"PRAGMA busy_timeout = {int(DB_BUSY_TIMEOUT_MS)}")
+    conn.execute(f"PRAGMA journal_mode = {DB_JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous = {DB_SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size = -{int(DB_CACHE_SIZE_KB)}")
+    conn.execute(f"PRAGMA mmap_size = {int(DB_MMAP_SIZE)}")
+    conn.execute("PRAGMA foreign_keys = ON")
+    if _checkpointer is not None:
+        # The checkpointer thread does this work off the commit path
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+
+
+def close_db():
+    """Close this thread's connection (the next get_db() opens a new one)."""
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.close()
+        _local.conn = None
+
+
+def checkpoint(mode="PASSIVE"):
+    """
+    Copy committed WAL pages back into the database file.
+    PASSIVE never waits on readers or writers; TRUNCATE also resets the WAL
+    file but waits (up to the busy timeout) for readers to move on.
+    Returns (busy, wal_pages, checkpointed_pages).
+    """
+    row = get_db().execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+    return tuple(row)
+
+
+def start_checkpointer(stop_event, interval=None):
+    """
+    Checkpoint the WAL every `interval` seconds (DB_CHECKPOINT_INTERVAL) on
+    a background thread until stop_event is set. Meanwhile this thread's
+    connection and any opened later don't checkpoint on commit, so the
+    resident watcher's cycles never pay for one.
+    """
+    global _checkpointer
+    if DB_JOURNAL_MODE.upper() != "WAL" or _checkpointer is not None:
+        return _checkpointer
+    interval = interval or DB_CHECKPOINT_INTERVAL
+
+    def run():
+        global _checkpointer
+        while not stop_event.wait(interval):
+            try:
+                busy, wal_pages, done = checkpoint()
+                if wal_pages >= DB_CHECKPOINT_TRUNCATE_PAGES and done == wal_pages:
+                    busy, wal_pages, done = checkpoint("TRUNCATE")
+                logger.debug(f"WAL checkpoint: {done}/{wal_pages} pages (busy={busy})")
+            except sqlite3.Error as e:
+                logger.warning(f"WAL checkpoint failed: {e}")
+        try:
+            checkpoint("TRUNCATE")
+        except sqlite3.Error as e:
+            logger.warning(f"Final WAL checkpoint failed: {e}")
+        close_db()
+        _checkpointer = None
+
+    _checkpointer = threading.Thread(target=run, name="db-checkpointer", daemon=True)
+    conn = getattr(_local, "conn", None)
+    if conn is not None:
+        conn.execute("PRAGMA wal_autocheckpoint = 0")
+    _checkpointer.start()
+    logger.info(f"WAL checkpointer started (every {interval}s)")
+    return _checkpointer
+
+
+def _add_column(conn, table, column, decl):
+    """Add a column to an existing table if it isn't there yet."""
+    columns = {row["name"] for row in conn.execute(f"PRAGMA table_info({table})")}
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def _migration_1(conn):
+    """Initial tables."""
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS users (
         user_id TEXT PRIMARY KEY,
         phone TEXT,
         tier TEXT DEFAULT 'free',
         created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         last_activity TIMESTAMP
-    );
-
+    )""")
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS watches (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id TEXT NOT NULL,
@@ -45,8 +185,8 @@ def _init_schema(conn):
         buy_url TEXT,
         FOREIGN KEY(user_id) REFERENCES users(user_id),
         UNIQUE(user_id, event_id)
-    );
-
+    )""")
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS alerts_sent (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         watch_id INTEGER NOT NULL,
@@ -56,8 +196,8 @@ def _init_schema(conn):
         sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         FOREIGN KEY(watch_id) REFERENCES watches(id),
         FOREIGN KEY(user_id) REFERENCES users(user_id)
-    );
-
+    )""")
+    conn.execute("""
     CREATE TABLE IF NOT EXISTS subscriptions (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         user_id TEXT NOT NULL,
@@ -67,23 +207,270 @@ def _init_schema(conn):
         started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
         expires_at TIMESTAMP,
         FOREIGN KEY(user_id) REFERENCES users(user_id)
-    );
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_watches_user_status ON watches(user_id, status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_watches_status ON watches(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_watch ON alerts_sent(watch_id)")
+
+
+def _migration_2(conn):
+    """Watch leases for concurrent watcher workers."""
+    _add_column(conn, "watches", "lease_owner", "TEXT")
+    _add_column(conn, "watches", "lease_expires", "TIMESTAMP")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_watches_lease ON watches(status, lease_expires)")
+
+
+def _migration_3(conn):
+    """Per-event scheduling state."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS event_state (
+        event_id TEXT PRIMARY KEY,
+        last_status TEXT,
+        last_price REAL,
+        last_change_at TIMESTAMP,
+        next_check_at TIMESTAMP,
+        updated_at TIMESTAMP
+    )""")
+    _add_column(conn, "event_state", "fingerprint", "TEXT")
+
+
+def _migration_4(conn):
+    """Daily Ticketmaster call counts."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS api_usage (
+        day TEXT PRIMARY KEY,
+        calls INTEGER NOT NULL DEFAULT 0
+    )""")
 
-    CREATE INDEX IF NOT EXISTS idx_watches_user_status ON watches(user_id, status);
-    CREATE INDEX IF NOT EXISTS idx_watches_status ON watches(status);
-    CREATE INDEX IF NOT EXISTS idx_alerts_watch ON alerts_sent(watch_id);
-    """)
-    conn.commit()
+
+def _migration_5(conn):
+    """Local event catalog, with an FTS5 index when SQLite has it."""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS catalog_events (
+        id TEXT PRIMARY KEY,
+        name TEXT,
+        venue TEXT,
+        city TEXT,
+        date TEXT,
+        time TEXT,
+        status TEXT,
+        price_min REAL,
+        price_max REAL,
+        url TEXT,
+        synced_at TIMESTAMP
+    )""")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_catalog_date ON catalog_events(date)")
+    try:
+        conn.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5("
+            "event_id UNINDEXED, name, venue, city, tokenize='unicode61 remove_diacritics 2')"
+        )
+    except sqlite3.OperationalError as e:
+        logger.warning(f"FTS5 unavailable, catalog search falls back to LIKE: {e}")
+
+
+def _migration_6(conn):
+    """
+    Normalise events: metadata, observed state and leases move from every
+    watch row (and event_state) to one events row per event. watches keeps
+    only per-user fields; the watch_details view has the old watch columns.
+    """
+    conn.execute("""
+    CREATE TABLE events (
+        event_id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        venue TEXT,
+        date_start TEXT,
+        buy_url TEXT,
+        last_status TEXT,
+        last_price REAL,
+        last_change_at TIMESTAMP,
+        last_checked TIMESTAMP,
+        next_check_at TIMESTAMP,
+        fingerprint TEXT,
+        watcher_count INTEGER NOT NULL DEFAULT 0,
+        lease_owner TEXT,
+        lease_expires TIMESTAMP,
+        updated_at TIMESTAMP
+    )""")
+    conn.execute("""
+    INSERT INTO events (event_id, name, venue, date_start, buy_url, last_status, last_price,
+                        last_change_at, last_checked, next_check_at, fingerprint, updated_at)
+    SELECT w.event_id, MAX(w.event_name), MAX(w.venue), MAX(w.date_start), MAX(w.buy_url),
+           s.last_status, s.last_price, s.last_change_at, MAX(w.last_checked), s.next_check_at,
+           s.fingerprint, s.updated_at
+    FROM watches w LEFT JOIN event_state s ON s.event_id = w.event_id
+    GROUP BY w.event_id""")
+
+    conn.execute("""
+    CREATE TABLE watches_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        event_id TEXT NOT NULL,
+        max_price REAL,
+        quantity INTEGER DEFAULT 1,
+        status TEXT DEFAULT 'active',
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        alerted_at TIMESTAMP,
+        FOREIGN KEY(user_id) REFERENCES users(user_id),
+        FOREIGN KEY(event_id) REFERENCES events(event_id),
+        UNIQUE(user_id, event_id)
+    )""")
+    conn.execute("""
+    INSERT INTO watches_new (id, user_id, event_id, max_price, quantity, status, created_at, alerted_at)
+    SELECT id, user_id, event_id, max_price, quantity, status, created_at, alerted_at FROM watches""")
+    conn.execute("DROP TABLE watches")
+    conn.execute("ALTER TABLE watches_new RENAME TO watches")
+    conn.execute("DROP TABLE IF EXISTS event_state")
+
+    conn.execute("CREATE INDEX idx_watches_user_status ON watches(user_id, status)")
+    conn.execute("CREATE INDEX idx_watches_status ON watches(status)")
+    conn.execute("CREATE INDEX idx_watches_event ON watches(event_id, status, max_price)")
+    conn.execute("CREATE INDEX idx_events_due ON events(next_check_at) WHERE watcher_count > 0")
+
+    conn.execute("""
+    UPDATE events SET watcher_count = (
+        SELECT COUNT(*) FROM watches w WHERE w.event_id = events.event_id AND w.status = 'active'
+    )""")
+    conn.execute("""
+    CREATE TRIGGER watches_count_insert AFTER INSERT ON watches WHEN NEW.status = 'active'
+    BEGIN
+        UPDATE events SET watcher_count = watcher_count + 1 WHERE event_id = NEW.event_id;
+    END""")
+    conn.execute("""
+    CREATE TRIGGER watches_count_delete AFTER DELETE ON watches WHEN OLD.status = 'active'
+    BEGIN
+        UPDATE events SET watcher_count = watcher_count - 1 WHERE event_id = OLD.event_id;
+    END""")
+    conn.execute("""
+    CREATE TRIGGER watches_count_status AFTER UPDATE OF status ON watches
+    WHEN (OLD.status = 'active') != (NEW.status = 'active')
+    BEGIN
+        UPDATE events SET watcher_count = watcher_count + (CASE WHEN NEW.status = 'active' THEN 1 ELSE -1 END)
+        WHERE event_id = NEW.event_id;
+    END""")
+
+    conn.execute("""
+    CREATE VIEW watch_details AS
+    SELECT w.id, w.user_id, w.event_id, e.name AS event_name, e.venue, e.date_start,
+           w.max_price, w.quantity, w.status, w.created_at, e.last_checked, w.alerted_at,
+           e.buy_url
+    FROM watches w JOIN events e ON e.event_id = w.event_id""")
+
+
+def _migration_7(conn):
+    """
+    Price history: raw observations plus hourly and daily rollups
+    (see price_history.py). ts is Unix seconds; each table is clustered on
+    (event_id, ts) so an event's series is one range scan.
+    """
+    conn.execute("""
+    CREATE TABLE price_history (
+        event_id TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        status TEXT,
+        price_min REAL,
+        price_max REAL,
+        PRIMARY KEY (event_id, ts)
+    ) WITHOUT ROWID""")
+    for table in ("price_history_hourly", "price_history_daily"):
+        conn.execute(f"""
+        CREATE TABLE {table} (
+            event_id TEXT NOT NULL,
+            ts INTEGER NOT NULL,
+            status TEXT,
+            price_min REAL,
+            price_max REAL,
+            price_avg REAL,
+            samples INTEGER NOT NULL,
+            PRIMARY KEY (event_id, ts)
+        ) WITHOUT ROWID""")
+
+
+def _migration_8(conn):
+    """
+    Alert outbox: messages waiting for delivery, written in the same
+    transaction as the alert they belong to. A claim pushes available_at
+    out by the lease, so claimable rows are exactly the pending ones whose
+    available_at has passed.
+    """
+    conn.execute("""
+    CREATE TABLE alert_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        watch_id INTEGER,
+        user_id TEXT NOT NULL,
+        message TEXT NOT NULL,
+        state TEXT NOT NULL DEFAULT 'pending',
+        attempts INTEGER NOT NULL DEFAULT 0,
+        available_at TIMESTAMP NOT NULL,
+        claimed_by TEXT,
+        last_error TEXT,
+        created_at TIMESTAMP NOT NULL,
+        sent_at TIMESTAMP
+    )""")
+    conn.execute("CREATE INDEX idx_outbox_pending ON alert_outbox(available_at) WHERE state = 'pending'")
+
+
+def _migration_9(conn):
+    """
+    Shared per-second Ticketmaster window: calls counted per Unix second,
+    and interactive callers currently waiting for a slot (background
+    polling yields to them until they finish or expire).
+    """
+    conn.execute("""
+    CREATE TABLE api_rate (
+        second INTEGER PRIMARY KEY,
+        calls INTEGER NOT NULL DEFAULT 0
+    )""")
+    conn.execute("""
+    CREATE TABLE api_waiters (
+        owner TEXT PRIMARY KEY,
+        expires_at REAL NOT NULL
+    )""")
+
+
+# Applied in order; PRAGMA user_version records how many have run.
+# Migrations must also be safe on databases created before versioning
+# (user_version 0), hence IF NOT EXISTS and _add_column.
+MIGRATIONS = [_migration_1, _migration_2, _migration_3, _migration_4, _migration_5, _migration_6,
+              _migration_7, _migration_8, _migration_9]
+
+
+def migrate(conn):
+    """
+    Bring the schema up to date. Each migration runs in its own transaction,
+    with foreign keys off so tables can be rebuilt.
+    """
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version >= len(MIGRATIONS):
+        return
+    conn.execute("PRAGMA foreign_keys = OFF")
+    try:
+        while version < len(MIGRATIONS):
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Another process may have migrated while we waited for the lock
+                version = conn.execute("PRAGMA user_version").fetchone()[0]
+                if version < len(MIGRATIONS):
+                    MIGRATIONS[version](conn)
+                    version += 1
+                    conn.execute(f"PRAGMA user_version = {version}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            logger.info(f"Database schema at version {version}")
+    finally:
+        conn.execute("PRAGMA foreign_keys = ON")
 
 
 def create_user(user_id, phone=None):
     """Create or update a user."""
-    db = get_db()
-    db.execute(
-        "INSERT OR REPLACE INTO users (user_id, phone, last_activity) VALUES (?, ?, ?)",
-        (user_id, phone, datetime.now().isoformat())
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute(
+            "INSERT OR REPLACE INTO users (user_id, phone, last_activity) VALUES (?, ?, ?)",
+            (user_id, phone, datetime.now().isoformat())
+        )
     logger.info(f"User {user_id} created/updated")
 
 
@@ -101,29 +488,39 @@ def get_user_tier(user_id):
 
 
 def create_watch(user_id, event_id, event_name, venue, date_start, max_price, quantity, buy_url):
-    """Create a new watch."""
-    db = get_db()
+    """
+    Create a new watch, adding or refreshing its event.
+    The event's fingerprint is cleared so the next cycle evaluates the new
+    watch even if Ticketmaster hasn't changed.
+    """
     try:
-        db.execute(
-            """INSERT INTO watches 
-               (user_id, event_id, event_name, venue, date_start, max_price, quantity, buy_url)
-               VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
-            (user_id, event_id, event_name, venue, date_start, max_price, quantity, buy_url)
-        )
-        db.commit()
-        watch_id = db.lastrowid
-        logger.info(f"Watch {watch_id} created for {user_id}: {event_name}")
-        return watch_id
+        with transaction() as db:
+            db.execute(
+                """INSERT INTO events (event_id, name, venue, date_start, buy_url, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(event_id) DO UPDATE SET
+                       name=excluded.name, venue=excluded.venue, date_start=excluded.date_start,
+                       buy_url=excluded.buy_url, updated_at=excluded.updated_at,
+                       fingerprint=NULL, next_check_at=NULL""",
+                (event_id, event_name, venue, date_start, buy_url, datetime.now().isoformat())
+            )
+            cur = db.execute(
+                "INSERT INTO watches (user_id, event_id, max_price, quantity) VALUES (?, ?, ?, ?)",
+                (user_id, event_id, max_price, quantity)
+            )
     except sqlite3.IntegrityError:
         logger.warning(f"Watch already exists for {user_id}: {event_id}")
         return None
+    watch_id = cur.lastrowid
+    logger.info(f"Watch {watch_id} created for {user_id}: {event_name}")
+    return watch_id
 
 
 def get_user_watches(user_id, status="active"):
     """Get all watches for a user."""
     db = get_db()
     rows = db.execute(
-        "SELECT * FROM watches WHERE user_id=? AND status=? ORDER BY created_at DESC",
+        "SELECT * FROM watch_details WHERE user_id=? AND status=? ORDER BY created_at DESC",
         (user_id, status)
     ).fetchall()
     return [dict(row) for row in rows]
@@ -133,47 +530,324 @@ def get_active_watches():
     """Get all active watches (for cron checker)."""
     db = get_db()
     rows = db.execute(
-        "SELECT * FROM watches WHERE status='active' ORDER BY last_checked ASC"
+        "SELECT * FROM watch_details WHERE status='active' ORDER BY last_checked ASC"
     ).fetchall()
     return [dict(row) for row in rows]
 
 
-def update_watch_status(watch_id, status, last_checked=None):
-    """Update watch status (active/alerted/cancelled)."""
+def get_event_watches(event_id, min_price=None):
+    """
+    Active watches on one event (watch_details rows). With min_price, only
+    those it satisfies: no max_price, or max_price >= min_price
+    (idx_watches_event covers the filter).
+    """
+    db = get_db()
+    if min_price is None:
+        rows = db.execute(
+            "SELECT * FROM watch_details WHERE event_id=? AND status='active'", (event_id,)
+        ).fetchall()
+    else:
+        rows = db.execute(
+            """SELECT * FROM watch_details WHERE event_id=? AND status='active'
+                 AND (max_price IS NULL OR max_price >= ?)""",
+            (event_id, min_price)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def claim_events(owner, max_events, lease_seconds, checked_before=None):
+    """
+    Atomically lease up to max_events due events to owner.
+    An event is due when it has active watches and its next_check_at has
+    passed (or was never set). Events leased by another worker are skipped
+    until their lease expires, so a crashed worker's batch is picked up by
+    someone else. Events checked since checked_before are skipped too.
+    Returns the claimed events rows (most overdue first).
+    """
+    now = datetime.now()
+    now_str = now.isoformat()
+    expires = (now + timedelta(seconds=lease_seconds)).isoformat()
+    checked_before = checked_before or now_str
+
+    with transaction() as db:
+        event_ids = [row["event_id"] for row in db.execute(
+            """SELECT event_id FROM events
+               WHERE watcher_count > 0
+                 AND (next_check_at IS NULL OR next_check_at <= ?)
+                 AND (lease_expires IS NULL OR lease_expires < ?)
+                 AND (last_checked IS NULL OR last_checked < ?)
+               ORDER BY COALESCE(next_check_at, '') LIMIT ?""",
+            (now_str, now_str, checked_before, max_events)
+        )]
+        if not event_ids:
+            return []
+
+        marks = ",".join("?" * len(event_ids))
+        db.execute(
+            f"UPDATE events SET lease_owner=?, lease_expires=? WHERE event_id IN ({marks})",
+            (owner, expires, *event_ids)
+        )
+        rows = db.execute(
+            f"""SELECT * FROM events WHERE event_id IN ({marks})
+                ORDER BY COALESCE(next_check_at, '')""",
+            tuple(event_ids)
+        ).fetchall()
+
+    logger.debug(f"{owner} claimed {len(rows)} events")
+    return [dict(row) for row in rows]
+
+
+def get_next_check_at():
+    """
+    Earliest time any event with active watches is due (ISO string).
+    Events never scheduled count as due now; None if nothing is active.
+    """
     db = get_db()
+    row = db.execute(
+        """SELECT MIN(COALESCE(next_check_at, ?)) AS due_at
+           FROM events WHERE watcher_count > 0""",
+        (datetime.now().isoformat(),)
+    ).fetchone()
+    return row["due_at"] if row else None
+
+
+def update_watch_status(watch_id, status, last_checked=None):
+    """Update watch status (active/alerted/cancelled) and mark its event checked."""
     now = datetime.now().isoformat() if last_checked is None else last_checked
-    db.execute(
-        "UPDATE watches SET status=?, last_checked=? WHERE id=?",
-        (status, now, watch_id)
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute("UPDATE watches SET status=? WHERE id=?", (status, watch_id))
+        db.execute(
+            "UPDATE events SET last_checked=? WHERE event_id=(SELECT event_id FROM watches WHERE id=?)",
+            (now, watch_id)
+        )
 
 
 def cancel_watch(watch_id):
     """Cancel a watch."""
-    db = get_db()
-    db.execute("UPDATE watches SET status='cancelled' WHERE id=?", (watch_id,))
-    db.commit()
+    with transaction() as db:
+        db.execute("UPDATE watches SET status='cancelled' WHERE id=?", (watch_id,))
     logger.info(f"Watch {watch_id} cancelled")
 
 
-def record_alert(watch_id, user_id, event_name, current_price):
-    """Record that an alert was sent for this watch."""
-    db = get_db()
-    db.execute(
-        "INSERT INTO alerts_sent (watch_id, user_id, event_name, current_price) VALUES (?,?,?,?)",
-        (watch_id, user_id, event_name, current_price)
-    )
-    db.commit()
-    # Update watch to 'alerted' status
-    db.execute(
-        "UPDATE watches SET status='alerted', alerted_at=? WHERE id=?",
-        (datetime.now().isoformat(), watch_id)
-    )
-    db.commit()
+def record_alert(watch_id, user_id, event_name, current_price, message=None):
+    """
+    Record an alert for this watch, mark the watch alerted and queue its
+    message in the outbox, all in one transaction.
+    """
+    now = datetime.now().isoformat()
+    with transaction() as db:
+        db.execute(
+            "INSERT INTO alerts_sent (watch_id, user_id, event_name, current_price) VALUES (?,?,?,?)",
+            (watch_id, user_id, event_name, current_price)
+        )
+        db.execute("UPDATE watches SET status='alerted', alerted_at=? WHERE id=?", (now, watch_id))
+        if message is not None:
+            _queue_messages(db, [(watch_id, user_id, message, now)])
     logger.info(f"Alert recorded for watch {watch_id}")
 
 
+def _queue_messages(db, messages):
+    """Insert (watch_id, user_id, message, now) rows into the outbox; caller commits."""
+    db.executemany(
+        """INSERT INTO alert_outbox (watch_id, user_id, message, available_at, created_at)
+           VALUES (?, ?, ?, ?, ?)""",
+        [(watch_id, user_id, message, now, now) for watch_id, user_id, message, now in messages]
+    )
+
+
+def enqueue_alert(user_id, message, watch_id=None):
+    """Queue a message that isn't tied to a recorded alert. Returns its outbox id."""
+    now = datetime.now().isoformat()
+    with transaction() as db:
+        cur = db.execute(
+            """INSERT INTO alert_outbox (watch_id, user_id, message, available_at, created_at)
+               VALUES (?, ?, ?, ?, ?)""",
+            (watch_id, user_id, message, now, now)
+        )
+    return cur.lastrowid
+
+
+def claim_alerts(owner, limit, lease_seconds, max_attempts):
+    """
+    Atomically lease up to limit pending outbox messages to owner, oldest
+    first. A message not acked or nacked before its lease expires is handed
+    out again; one that has used max_attempts is marked failed instead.
+    Returns dicts with id, user_id, phone, message and attempts (this one
+    included).
+    """
+    now = datetime.now()
+    now_str = now.isoformat()
+    expires = (now + timedelta(seconds=lease_seconds)).isoformat()
+
+    with transaction() as db:
+        db.execute(
+            """UPDATE alert_outbox SET state='failed', claimed_by=NULL,
+                                        last_error=COALESCE(last_error, 'lease expired')
+               WHERE state='pending' AND available_at <= ? AND attempts >= ?""",
+            (now_str, max_attempts)
+        )
+        ids = [row["id"] for row in db.execute(
+            """SELECT id FROM alert_outbox WHERE state='pending' AND available_at <= ?
+               ORDER BY available_at LIMIT ?""",
+            (now_str, limit)
+        )]
+        if not ids:
+            return []
+
+        marks = ",".join("?" * len(ids))
+        db.execute(
+            f"""UPDATE alert_outbox SET claimed_by=?, available_at=?, attempts=attempts + 1
+                WHERE id IN ({marks})""",
+            (owner, expires, *ids)
+        )
+        rows = db.execute(
+            f"""SELECT o.id, o.user_id, u.phone, o.message, o.attempts
+                FROM alert_outbox o LEFT JOIN users u ON u.user_id = o.user_id
+                WHERE o.id IN ({marks}) ORDER BY o.id""",
+            tuple(ids)
+        ).fetchall()
+
+    logger.debug(f"{owner} claimed {len(rows)} alerts")
+    return [dict(row) for row in rows]
+
+
+def ack_alerts(owner, alert_ids):
+    """Mark messages owner delivered as sent. Returns how many were still leased to owner."""
+    if not alert_ids:
+        return 0
+    now = datetime.now().isoformat()
+    with transaction() as db:
+        return sum(db.execute(
+            """UPDATE alert_outbox SET state='sent', sent_at=?, last_error=NULL
+               WHERE id=? AND state='pending' AND claimed_by=?""",
+            (now, alert_id, owner)
+        ).rowcount for alert_id in alert_ids)
+
+
+def nack_alert(owner, alert_id, error, retry_delay, max_attempts):
+    """
+    Hand a message owner failed to deliver back to the outbox, to be retried
+    after retry_delay seconds doubled per attempt so far; failed for good
+    once it has used max_attempts. Returns the new state, or None if owner
+    no longer holds it.
+    """
+    with transaction() as db:
+        row = db.execute(
+            "SELECT attempts FROM alert_outbox WHERE id=? AND state='pending' AND claimed_by=?",
+            (alert_id, owner)
+        ).fetchone()
+        if not row:
+            return None
+        state = "failed" if row["attempts"] >= max_attempts else "pending"
+        retry_at = datetime.now() + timedelta(seconds=retry_delay * 2 ** (row["attempts"] - 1))
+        db.execute(
+            """UPDATE alert_outbox SET state=?, available_at=?, claimed_by=NULL, last_error=?
+               WHERE id=? AND state='pending' AND claimed_by=?""",
+            (state, retry_at.isoformat(), error, alert_id, owner)
+        )
+    return state
+
+
+def purge_alert_outbox(keep_days):
+    """Delete sent and failed messages older than keep_days. Returns how many."""
+    cutoff = (datetime.now() - timedelta(days=keep_days)).isoformat()
+    with transaction() as db:
+        return db.execute(
+            "DELETE FROM alert_outbox WHERE state != 'pending' AND created_at < ?", (cutoff,)
+        ).rowcount
+
+
+def get_outbox_stats():
+    """Outbox message counts by state, plus the oldest pending message's age."""
+    db = get_db()
+    stats = {row["state"]: row["cnt"] for row in db.execute(
+        "SELECT state, COUNT(*) AS cnt FROM alert_outbox GROUP BY state"
+    )}
+    row = db.execute("SELECT MIN(created_at) AS oldest FROM alert_outbox WHERE state='pending'").fetchone()
+    stats["oldest_pending"] = row["oldest"] if row else None
+    return stats
+
+
+class CycleBatch:
+    """
+    Collects a watch cycle's writes (event checks and state, price samples,
+    alerts and their outbox messages, lease releases) and flushes them in a single transaction with executemany,
+    instead of one connection and commit per watch.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def clear(self):
+        self.events_checked = []
+        self.alerts = []
+        self.event_states = []
+        self.prices = []
+        self.releases = []
+
+    def __len__(self):
+        return (len(self.events_checked) + len(self.alerts) + len(self.event_states)
+                + len(self.prices) + len(self.releases))
+
+    def event_checked(self, event_id, last_checked=None):
+        self.events_checked.append((last_checked or datetime.now().isoformat(), event_id))
+
+    def alert_sent(self, watch_id, user_id, event_name, current_price, message=None):
+        self.alerts.append((watch_id, user_id, event_name, current_price, datetime.now().isoformat(),
+                            message))
+
+    def event_state(self, event_id, last_status, last_price, last_change_at, next_check_at,
+                    fingerprint=None):
+        self.event_states.append(
+            (last_status, last_price, last_change_at, next_check_at, fingerprint,
+             datetime.now().isoformat(), event_id)
+        )
+
+    def price_observed(self, event_id, status, price_min, price_max, ts=None):
+        self.prices.append((event_id, int(ts or time.time()), status, price_min, price_max))
+
+    def release(self, owner, event_ids):
+        self.releases.extend((event_id, owner) for event_id in event_ids)
+
+    def flush(self):
+        """Write everything collected so far in one transaction."""
+        if not len(self):
+            return
+        with transaction() as db:
+            db.executemany("UPDATE events SET last_checked=? WHERE event_id=?", self.events_checked)
+            db.executemany(
+                "INSERT INTO alerts_sent (watch_id, user_id, event_name, current_price) VALUES (?,?,?,?)",
+                [alert[:4] for alert in self.alerts]
+            )
+            db.executemany(
+                "UPDATE watches SET status='alerted', alerted_at=? WHERE id=?",
+                [(alerted_at, watch_id) for watch_id, _, _, _, alerted_at, _ in self.alerts]
+            )
+            _queue_messages(db, [
+                (watch_id, user_id, message, alerted_at)
+                for watch_id, user_id, _, _, alerted_at, message in self.alerts if message is not None
+            ])
+            db.executemany(
+                """UPDATE events SET last_status=?, last_price=?, last_change_at=?, next_check_at=?,
+                                     fingerprint=?, updated_at=?
+                   WHERE event_id=?""",
+                self.event_states
+            )
+            # Two checks in the same second keep the later one
+            db.executemany(
+                """INSERT OR REPLACE INTO price_history (event_id, ts, status, price_min, price_max)
+                   VALUES (?, ?, ?, ?, ?)""",
+                self.prices
+            )
+            db.executemany(
+                "UPDATE events SET lease_owner=NULL, lease_expires=NULL WHERE event_id=? AND lease_owner=?",
+                self.releases
+            )
+        logger.debug(f"Flushed {len(self.events_checked)} event checks, {len(self.alerts)} alerts, "
+                     f"{len(self.event_states)} event states, {len(self.prices)} price samples")
+        self.clear()
+
+
 def count_active_watches(user_id):
     """Count active watches for a user."""
     db = get_db()
@@ -192,3 +866,71 @@ def get_recent_alerts(limit=10):
         (limit,)
     ).fetchall()
     return [dict(row) for row in rows]
+
+
+def reserve_api_call(day, limit):
+    """
+    Count one Ticketmaster call against the day's budget if it is under limit.
+    Atomic across processes. Returns False once the limit is reached.
+    """
+    with transaction() as db:
+        db.execute("INSERT OR IGNORE INTO api_usage (day, calls) VALUES (?, 0)", (day,))
+        cur = db.execute(
+            "UPDATE api_usage SET calls = calls + 1 WHERE day=? AND calls < ?",
+            (day, limit)
+        )
+    return cur.rowcount == 1
+
+
+# Seconds of api_rate history kept; older rows are deleted as new seconds start
+_API_RATE_HISTORY = 60
+
+# Marks a second as full (after a 429) whatever the limit
+_API_RATE_BLOCKED = 1 << 30
+
+
+def reserve_api_slot(second, limit, yield_to_waiters=False):
+    """
+    Count one Ticketmaster call in this Unix second's window if it has fewer
+    than limit calls. With yield_to_waiters (background calls), also refuse
+    while any interactive caller is waiting. Atomic across processes.
+    """
+    with transaction() as db:
+        if yield_to_waiters and db.execute(
+            "SELECT 1 FROM api_waiters WHERE expires_at > ? LIMIT 1", (time.time(),)
+        ).fetchone():
+            return False
+        if db.execute("INSERT OR IGNORE INTO api_rate (second, calls) VALUES (?, 0)", (second,)).rowcount:
+            db.execute("DELETE FROM api_rate WHERE second < ?", (second - _API_RATE_HISTORY,))
+        cur = db.execute(
+            "UPDATE api_rate SET calls = calls + 1 WHERE second=? AND calls < ?", (second, limit)
+        )
+    return cur.rowcount == 1
+
+
+def block_api_slots(start, seconds):
+    """Fill the shared window from Unix second start for seconds (Ticketmaster said 429)."""
+    with transaction() as db:
+        db.executemany(
+            """INSERT INTO api_rate (second, calls) VALUES (?, ?)
+               ON CONFLICT(second) DO UPDATE SET calls=excluded.calls""",
+            [(second, _API_RATE_BLOCKED) for second in range(start, start + seconds)]
+        )
+
+
+def set_api_waiter(owner, expires_at):
+    """Register an interactive caller waiting for a slot until expires_at; None removes it."""
+    with transaction() as db:
+        if expires_at is None:
+            db.execute("DELETE FROM api_waiters WHERE owner=?", (owner,))
+        else:
+            db.execute("INSERT OR REPLACE INTO api_waiters (owner, expires_at) VALUES (?, ?)",
+                       (owner, expires_at))
+        db.execute("DELETE FROM api_waiters WHERE expires_at <= ?", (time.time(),))
+
+
+def get_api_usage(day):
+    """Ticketmaster calls made on the given day."""
+    db = get_db()
+    row = db.execute("SELECT calls FROM api_usage WHERE day=?", (day,)).fetchone()
+    return row["calls"] if row else 0
@@ -11,6 +11,8 @@ from database import (
     get_user_watches, cancel_watch, get_active_watches
 )
 from tm_api import search_events, get_event, format_event, check_availability
+from quota import QuotaExceeded
+from resilience import ServiceUnavailable
 from config import FREE_TIER_MAX_WATCHES
 
 logger = logging.getLogger(__name__)
@@ -31,20 +33,28 @@ def handle_message(user_id, phone, message_text):
     intent = intent_result.get("intent")
 
     # Handle each intent type
-    if intent == "search":
-        return handle_search(user_id, intent_result)
-    elif intent == "watch":
-        return handle_watch(user_id, intent_result)
-    elif intent == "list":
-        return handle_list(user_id)
-    elif intent == "cancel":
-        return handle_cancel(user_id, intent_result)
-    elif intent == "status":
-        return handle_status(user_id)
-    elif intent == "help":
-        return handle_help()
-    else:
-        return {"error": "Unknown intent", "message": "Sorry, I didn't understand that."}
+    try:
+        if intent == "search":
+            return handle_search(user_id, intent_result)
+        elif intent == "watch":
+            return handle_watch(user_id, intent_result)
+        elif intent == "list":
+            return handle_list(user_id)
+        elif intent == "cancel":
+            return handle_cancel(user_id, intent_result)
+        elif intent == "status":
+            return handle_status(user_id)
+        elif intent == "help":
+            return handle_help()
+        else:
+            return {"error": "Unknown intent", "message": "Sorry, I didn't understand that."}
+    except (QuotaExceeded, ServiceUnavailable) as e:
+        logger.warning(f"Ticketmaster unavailable handling {intent} for {user_id}: {e}")
+        return {
+            "intent": intent,
+            "error": True,
+            "message": "Ticketmaster is busy right now. Please try again in a few minutes."
+        }
 
 
 def handle_search(user_id, intent_result):
@@ -63,29 +73,23 @@ def handle_search(user_id, intent_result):
             "message": f"No events found for '{query}'. Try a different artist or venue name."
         }
 
-    # Format results
-    formatted_events = []
-    for event in events[:5]:  # Top 5 results
-        fmt = format_event(event)
-        if fmt:
-            formatted_events.append(fmt)
-
-    response_lines = [f"🎵 Found {len(formatted_events)} events:\n"]
-    for i, event in enumerate(formatted_events, 1):
-        status_emoji = "✅" if event["status"] == "onsale" else "❌"
-        price_str = f"€{event['price_min']}-{event['price_max']}" if event['price_min'] else "TBA"
+    events = events[:5]  # Top 5 results
+    response_lines = [f"🎵 Found {len(events)} events:\n"]
+    for i, event in enumerate(events, 1):
+        status_emoji = "✅" if event.status == "onsale" else "❌"
+        price_str = f"€{event.price_min}-{event.price_max}" if event.price_min else "TBA"
         response_lines.append(
-            f"{i}. **{event['name']}**\n"
-            f"   📍 {event['venue']}, {event['city']}\n"
-            f"   📅 {event['date']} {event['time']}\n"
+            f"{i}. **{event.name}**\n"
+            f"   📍 {event.venue}, {event.city}\n"
+            f"   📅 {event.date} {event.time}\n"
             f"   💰 {price_str}\n"
-            f"   {status_emoji} {event['status']}"
+            f"   {status_emoji} {event.status}"
         )
 
     return {
         "intent": "search",
         "found": True,
-        "events": formatted_events,
+        "events": [format_event(event) for event in events],
         "message": "\n".join(response_lines),
         "follow_up": "Want to watch for any of these? Say 'watch for [event] under €[price]'"
     }
@@ -129,22 +133,20 @@ def handle_watch(user_id, intent_result):
 
     # Use first result
     event = events[0]
-    event_id = event.get("id")
-    fmt = format_event(event)
 
     # Confirm with user before creating watch
-    status_emoji = "✅" if fmt["status"] == "onsale" else "❌"
-    price_str = f"€{fmt['price_min']}-{fmt['price_max']}" if fmt['price_min'] else "TBA"
-    price_info = f" (currently {price_str})" if fmt['price_min'] else ""
+    status_emoji = "✅" if event.status == "onsale" else "❌"
+    price_str = f"€{event.price_min}-{event.price_max}" if event.price_min else "TBA"
+    price_info = f" (currently {price_str})" if event.price_min else ""
     max_price_info = f" under €{max_price}" if max_price else ""
 
     response_lines = [
         f"🎫 Confirm your watch:\n",
-        f"**{fmt['name']}**{price_info}",
-        f"📍 {fmt['venue']} ({fmt['city']})",
-        f"📅 {fmt['date']}",
+        f"**{event.name}**{price_info}",
+        f"📍 {event.venue} ({event.city})",
+        f"📅 {event.date}",
         f"🔔 Alert me for {quantity}x tickets{max_price_info}",
-        f"{status_emoji} Current status: {fmt['status']}\n",
+        f"{status_emoji} Current status: {event.status}\n",
         f"Reply with 'yes' to confirm or 'cancel' to skip."
     ]
 
@@ -152,13 +154,13 @@ def handle_watch(user_id, intent_result):
         "intent": "watch",
         "action": "confirm",
         "message": "\n".join(response_lines),
-        "event_id": event_id,
-        "event_name": fmt["name"],
-        "venue": fmt["venue"],
-        "date": fmt["date"],
+        "event_id": event.id,
+        "event_name": event.name,
+        "venue": event.venue,
+        "date": event.date,
         "max_price": max_price,
         "quantity": quantity,
-        "buy_url": fmt["url"]
+        "buy_url": event.url
     }
 
 
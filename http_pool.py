@@ -0,0 +1,237 @@
+"""
+TicketWatch HTTP Connection Pool
+Keep-alive connections to one host, reused across calls and threads (or
+coroutines) so each request skips the TCP/TLS handshake
+"""
+import io
+import gzip
+import zlib
+import queue
+import asyncio
+import logging
+import threading
+import http.client
+import ssl
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# What a reused keep-alive connection the server already closed fails with.
+# Anything else (notably timeouts) is a real failure and isn't retried here.
+_STALE_ERRORS = (http.client.RemoteDisconnected, ConnectionResetError, ConnectionAbortedError,
+                 BrokenPipeError)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of persistent HTTP(S) connections to a single host.
+    At most `size` requests are in flight; extra callers wait for a slot.
+    """
+
+    def __init__(self, base_url, size=8, timeout=10):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port
+        self.timeout = timeout
+        self.size = size
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self._idle = queue.LifoQueue()  # Most recently used first: least likely to be stale
+        self._slots = threading.BoundedSemaphore(size)
+
+    def _connect(self):
+        if self.scheme == "https":
+            return http.client.HTTPSConnection(
+                self.host, self.port, timeout=self.timeout, context=self._ssl_context
+            )
+        return http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+
+    def _checkout(self):
+        try:
+            return self._idle.get_nowait(), True
+        except queue.Empty:
+            return self._connect(), False
+
+    def request(self, method, path, headers=None):
+        """
+        Send a request and read the whole response.
+        Returns (status, reason, headers, body) with gzip/deflate bodies decoded.
+        A reused connection the server already closed is retried once on a
+        fresh one; timeouts and other errors are raised as they are.
+        """
+        headers = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive", **(headers or {})}
+        with self._slots:
+            conn, reused = self._checkout()
+            while True:
+                try:
+                    conn.request(method, path, headers=headers)
+                    resp = conn.getresponse()
+                    body = resp.read()
+                    break
+                except _STALE_ERRORS:
+                    conn.close()
+                    if not reused:
+                        raise
+                    logger.debug(f"Stale keep-alive connection to {self.host}, reconnecting")
+                    conn, reused = self._connect(), False
+                except BaseException:
+                    conn.close()
+                    raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._idle.put(conn)
+
+        return resp.status, resp.reason, resp.headers, _decode(body, resp.headers.get("Content-Encoding"))
+
+    def close(self):
+        """Close all idle connections."""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+def _decode(body, encoding):
+    encoding = (encoding or "").lower()
+    if encoding == "gzip":
+        return gzip.decompress(body)
+    if encoding == "deflate":
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)  # Raw deflate
+    return body
+
+
+class AsyncConnectionPool:
+    """
+    asyncio counterpart of ConnectionPool: keep-alive streams to a single
+    host for one event loop. At most `size` requests are in flight; each
+    request (connect, send and read) is bounded by its timeout, and a
+    timed-out or cancelled request's connection is closed, never reused.
+    """
+
+    def __init__(self, base_url, size=32, timeout=10):
+        parts = urlsplit(base_url)
+        self.scheme = parts.scheme
+        self.host = parts.hostname
+        self.port = parts.port or (443 if self.scheme == "https" else 80)
+        self.timeout = timeout
+        self.size = size
+        self._ssl_context = ssl.create_default_context() if self.scheme == "https" else None
+        self._host_header = self.host if parts.port is None else f"{self.host}:{parts.port}"
+        self._idle = []  # LIFO like ConnectionPool
+        self._slots = asyncio.Semaphore(size)
+
+    async def request(self, method, path, headers=None, timeout=None):
+        """
+        Send a request and read the whole response.
+        Returns (status, reason, headers, body) like ConnectionPool.request.
+        Raises TimeoutError if it takes longer than timeout (default: the
+        pool's timeout).
+        """
+        headers = {"Accept-Encoding": "gzip, deflate", "Connection": "keep-alive", **(headers or {})}
+        timeout = self.timeout if timeout is None else timeout
+        async with self._slots:
+            try:
+                return await asyncio.wait_for(self._exchange(method, path, headers), timeout)
+            except asyncio.TimeoutError:
+                raise TimeoutError(f"{method} {self.host}{path.split('?')[0]} timed out after {timeout}s")
+
+    async def _exchange(self, method, path, headers):
+        conn, reused = await self._checkout()
+        while True:
+            reader, writer = conn
+            try:
+                status, reason, resp_headers, body, will_close = await self._roundtrip(
+                    reader, writer, method, path, headers
+                )
+                break
+            except (*_STALE_ERRORS, asyncio.IncompleteReadError):
+                writer.close()
+                if not reused:
+                    raise
+                logger.debug(f"Stale keep-alive connection to {self.host}, reconnecting")
+                conn, reused = await self._connect(), False
+            except BaseException:
+                writer.close()  # Failed or cancelled mid-response: the stream is unusable
+                raise
+
+        if will_close:
+            writer.close()
+        else:
+            self._idle.append(conn)
+        return status, reason, resp_headers, _decode(body, resp_headers.get("Content-Encoding"))
+
+    async def _checkout(self):
+        while self._idle:
+            reader, writer = self._idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return (reader, writer), True
+            writer.close()
+        return await self._connect(), False
+
+    async def _connect(self):
+        return await asyncio.open_connection(
+            self.host, self.port, ssl=self._ssl_context,
+            server_hostname=self.host if self._ssl_context else None
+        )
+
+    async def _roundtrip(self, reader, writer, method, path, headers):
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self._host_header}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+        parts = status_line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+        if len(parts) < 2 or not parts[0].startswith("HTTP/"):
+            raise http.client.BadStatusLine(status_line)
+        version, status, reason = parts[0], int(parts[1]), parts[2] if len(parts) > 2 else ""
+
+        raw = []
+        while True:
+            line = await reader.readline()
+            raw.append(line)
+            if line in (b"\r\n", b"\n", b""):
+                break
+        resp_headers = http.client.parse_headers(io.BytesIO(b"".join(raw)))
+
+        connection = (resp_headers.get("Connection") or "").lower()
+        will_close = connection == "close" or (version == "HTTP/1.0" and connection != "keep-alive")
+        if method == "HEAD" or status in (204, 304) or 100 <= status < 200:
+            body = b""
+        elif (resp_headers.get("Transfer-Encoding") or "").lower() == "chunked":
+            body = await _read_chunked(reader)
+        elif resp_headers.get("Content-Length") is not None:
+            body = await reader.readexactly(int(resp_headers["Content-Length"]))
+        else:
+            body = await reader.read()
+            will_close = True
+        return status, reason, resp_headers, body, will_close
+
+    async def close(self):
+        """Close all idle connections."""
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
+
+
+async def _read_chunked(reader):
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise http.client.IncompleteRead(b"".join(chunks))
+        size = int(size_line.split(b";")[0].strip(), 16)
+        if size == 0:
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass  # Trailers
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readline()
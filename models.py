@@ -0,0 +1,70 @@
+"""
+TicketWatch Models
+Compact records built once from Ticketmaster responses, so hot paths read
+attributes instead of re-walking the raw JSON
+"""
+
+
+class Event:
+    """
+    The fields of a Discovery API event that TicketWatch uses.
+    Missing values get the same defaults format_event has always shown
+    ("TBA" venue and date, "unknown" status).
+    """
+
+    __slots__ = ("id", "name", "venue", "city", "date", "time",
+                 "status", "price_min", "price_max", "url")
+
+    def __init__(self, id, name=None, venue="TBA", city="", date="TBA", time="",
+                 status="unknown", price_min=None, price_max=None, url=""):
+        self.id = id
+        self.name = name
+        self.venue = venue
+        self.city = city
+        self.date = date
+        self.time = time
+        self.status = status
+        self.price_min = price_min
+        self.price_max = price_max
+        self.url = url
+
+    @classmethod
+    def from_api(cls, data):
+        """Build an Event from a raw Discovery API event dict."""
+        venues = data.get("_embedded", {}).get("venues") or [{}]
+        dates = data.get("dates", {})
+        start = dates.get("start", {})
+        prices = data.get("priceRanges") or [{}]
+        return cls(
+            id=data.get("id"),
+            name=data.get("name"),
+            venue=venues[0].get("name", "TBA"),
+            city=venues[0].get("city", {}).get("name", ""),
+            date=start.get("localDate", "TBA"),
+            time=start.get("localTime", ""),
+            status=dates.get("status", {}).get("code", "unknown"),
+            price_min=prices[0].get("min"),
+            price_max=prices[0].get("max"),
+            url=data.get("url", "")
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        """Rebuild an Event from to_dict() output (disk cache, catalog)."""
+        return cls(**{field: data[field] for field in cls.__slots__ if field in data})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    @property
+    def fingerprint(self):
+        """status|min|max: the fields that decide availability."""
+        return f"{self.status}|{self.price_min}|{self.price_max}"
+
+    def __eq__(self, other):
+        if not isinstance(other, Event):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    def __repr__(self):
+        return f"Event({self.id!r}, {self.name!r}, {self.status!r})"
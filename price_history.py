@@ -0,0 +1,167 @@
+"""
+TicketWatch Price History
+Every status and price the watcher observes, kept raw for a few weeks and
+rolled up to hourly and daily series after that, so we can see when and
+how often tickets drop without the tables growing forever
+"""
+import json
+import time
+import logging
+from datetime import datetime
+from itertools import groupby
+from config import PRICE_HISTORY_RAW_DAYS, PRICE_HISTORY_HOURLY_DAYS, PRICE_HISTORY_DAILY_DAYS
+from database import get_db, transaction
+
+logger = logging.getLogger(__name__)
+
+HOUR = 3600
+DAY = 86400
+
+# resolution -> (table, bucket seconds, retention days); finest first
+_LEVELS = {
+    "raw": ("price_history", None, PRICE_HISTORY_RAW_DAYS),
+    "hourly": ("price_history_hourly", HOUR, PRICE_HISTORY_HOURLY_DAYS),
+    "daily": ("price_history_daily", DAY, PRICE_HISTORY_DAILY_DAYS),
+}
+
+# Raw rows read as rollup rows: one sample whose average is its minimum price
+_COLUMNS = {
+    "raw": "ts, status, price_min, price_max, price_min AS price_avg, 1 AS samples",
+    "hourly": "ts, status, price_min, price_max, price_avg, samples",
+    "daily": "ts, status, price_min, price_max, price_avg, samples",
+}
+
+
+def _rollup(db, event_id, source, target, end, now):
+    """
+    Aggregate one event's source rows before end into target buckets.
+    Starts from target's newest bucket so each run only reads new rows.
+    That bucket is recomputed (samples may have landed after it was rolled
+    up) only while retention hasn't started deleting its source rows;
+    after that it is final and rollup resumes with the next bucket.
+    """
+    table, _, source_days = _LEVELS[source]
+    target_table, width, _ = _LEVELS[target]
+    row = db.execute(f"SELECT MAX(ts) AS last FROM {target_table} WHERE event_id=?", (event_id,)).fetchone()
+    start = row["last"] or 0
+    if row["last"] is not None and row["last"] < now - source_days * DAY:
+        start += width
+    rows = db.execute(
+        f"SELECT {_COLUMNS[source]} FROM {table} WHERE event_id=? AND ts >= ? AND ts < ? ORDER BY ts",
+        (event_id, start, end)
+    ).fetchall()
+
+    buckets = []
+    for bucket, group in groupby(rows, key=lambda r: r["ts"] - r["ts"] % width):
+        group = list(group)
+        mins = [r["price_min"] for r in group if r["price_min"] is not None]
+        maxes = [r["price_max"] for r in group if r["price_max"] is not None]
+        priced = [r for r in group if r["price_avg"] is not None]
+        weight = sum(r["samples"] for r in priced)
+        buckets.append((
+            event_id, bucket, group[-1]["status"],
+            min(mins) if mins else None,
+            max(maxes) if maxes else None,
+            sum(r["price_avg"] * r["samples"] for r in priced) / weight if weight else None,
+            sum(r["samples"] for r in group)
+        ))
+    db.executemany(
+        f"""INSERT OR REPLACE INTO {target_table}
+            (event_id, ts, status, price_min, price_max, price_avg, samples)
+            VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        buckets
+    )
+    return len(buckets)
+
+
+def maintain(now=None):
+    """
+    Roll raw samples up to completed hours and hours up to completed (UTC)
+    days, then drop rows older than each level's retention. One short
+    transaction per event so the watcher is never blocked for long.
+    Safe to run from several processes.
+    """
+    now = int(now or time.time())
+    hour_end = now - now % HOUR
+    day_end = now - now % DAY
+    stats = {"events": 0, "hourly": 0, "daily": 0, "removed": 0}
+
+    event_ids = [row["event_id"] for row in get_db().execute("SELECT event_id FROM events")]
+    for event_id in event_ids:
+        with transaction() as db:
+            stats["hourly"] += _rollup(db, event_id, "raw", "hourly", hour_end, now)
+            stats["daily"] += _rollup(db, event_id, "hourly", "daily", day_end, now)
+            for table, _, days in _LEVELS.values():
+                stats["removed"] += db.execute(
+                    f"DELETE FROM {table} WHERE event_id=? AND ts < ?", (event_id, now - days * DAY)
+                ).rowcount
+        stats["events"] += 1
+
+    logger.info(f"Price history maintained: {stats}")
+    return stats
+
+
+def _fetch(db, level, event_id, start, end):
+    table, _, _ = _LEVELS[level]
+    rows = db.execute(
+        f"SELECT {_COLUMNS[level]} FROM {table} WHERE event_id=? AND ts >= ? AND ts < ? ORDER BY ts",
+        (event_id, start, end)
+    ).fetchall()
+    return [dict(row, resolution=level) for row in rows]
+
+
+def get_price_series(event_id, since=None, until=None, resolution="auto"):
+    """
+    One event's observations between two datetimes, oldest first.
+    Each point is a dict: ts (ISO), resolution, status, price_min,
+    price_max, price_avg and samples. resolution is raw, hourly or daily;
+    auto stitches them together, using the finest level available for
+    each stretch of time.
+    """
+    start = int(since.timestamp()) if since else 0
+    end = int(until.timestamp()) if until else int(time.time()) + 1
+    db = get_db()
+
+    if resolution != "auto":
+        points = _fetch(db, resolution, event_id, start, end)
+    else:
+        points = []
+        for level, (_, width, _) in _LEVELS.items():
+            # Coarser buckets only where they end before the finer data begins
+            boundary = points[0]["ts"] - (width or 0) + 1 if points else end
+            points = _fetch(db, level, event_id, start, boundary) + points
+
+    for point in points:
+        point["ts"] = datetime.fromtimestamp(point["ts"]).isoformat()
+    return points
+
+
+def get_price_changes(event_id, since=None, until=None):
+    """
+    Raw observations whose status or prices differ from the one before
+    (the first observation included): when tickets dropped, sold out or
+    came back.
+    """
+    changes = []
+    previous = None
+    for point in get_price_series(event_id, since, until, resolution="raw"):
+        current = (point["status"], point["price_min"], point["price_max"])
+        if current != previous:
+            changes.append(point)
+            previous = current
+    return changes
+
+
+if __name__ == "__main__":
+    import sys
+    from config import LOG_LEVEL, LOG_FORMAT
+    logging.basicConfig(level=LOG_LEVEL, format=LOG_FORMAT)
+
+    if len(sys.argv) > 1 and sys.argv[1] == "maintain":
+        print(json.dumps(maintain()))
+    elif len(sys.argv) > 1:
+        resolution = sys.argv[2] if len(sys.argv) > 2 else "auto"
+        for point in get_price_series(sys.argv[1], resolution=resolution):
+            print(json.dumps(point))
+    else:
+        print("Usage: python price_history.py maintain | <event_id> [raw|hourly|daily|auto]")
@@ -0,0 +1,246 @@
+"""
+TicketWatch API Quota Governor
+Keeps Ticketmaster calls under the per-second and daily limits, with
+interactive (user message) requests ahead of background polling
+"""
+import os
+import math
+import time
+import asyncio
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_INTERACTIVE = "interactive"
+PRIORITY_BACKGROUND = "background"
+
+
+class QuotaExceeded(Exception):
+    """Raised when a call would exceed the Ticketmaster quota."""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        if now < self._blocked_until:
+            self._updated = now
+            return
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, reserve=0):
+        """
+        Take a token if one is free beyond `reserve`.
+        Returns 0 on success, otherwise the seconds to wait before retrying.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self._tokens - reserve >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 + reserve - self._tokens) / self.rate
+
+    def acquire(self, reserve=0, timeout=None):
+        """Block until a token is taken. Returns False if timeout passes first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire(reserve)
+            if not wait:
+                return True
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def refund(self):
+        """Give back a token taken by try_acquire() that went unused."""
+        with self._lock:
+            if time.monotonic() >= self._blocked_until:
+                self._tokens = min(self.capacity, self._tokens + 1)
+
+    def block(self, seconds):
+        """Hand out no tokens for `seconds` (e.g. after an HTTP 429)."""
+        with self._lock:
+            self._tokens = 0.0
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @property
+    def tokens(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class QuotaGovernor:
+    """
+    Per-second rate limit plus a daily call budget.
+
+    A local token bucket paces this process. With a shared store, every
+    call must also win a slot in the cross-process per-second window
+    (`reserve_slot(second, limit, yield_to_waiters)`, the api_rate table)
+    and count against the daily budget (`reserve_call(day, limit)`, the
+    api_usage table), so the watcher and every handler process together
+    stay under both limits.
+    Background calls leave one call per second of headroom, wait while
+    interactive calls are queued (in any process, via `set_waiter`), and
+    stop at `interactive_reserve` of the daily budget so users can still
+    search once polling has used its share.
+    """
+
+    def __init__(self, rate_per_second, daily_limit, interactive_reserve=0.1,
+                 reserve_call=None, get_usage=None, reserve_slot=None, set_waiter=None,
+                 block_slots=None):
+        self.bucket = TokenBucket(rate_per_second)
+        self.daily_limit = daily_limit
+        self.background_limit = int(daily_limit * (1 - interactive_reserve))
+        self._reserve_call = reserve_call
+        self._get_usage = get_usage
+        self._reserve_slot = reserve_slot
+        self._set_waiter = set_waiter
+        self._block_slots = block_slots
+        self._interactive_waiting = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def today():
+        """Quota day (UTC)."""
+        return datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        Wait for permission to make one API call and count it against today's budget.
+        Raises QuotaExceeded if the daily budget is spent or the wait times out.
+        """
+        interactive = priority == PRIORITY_INTERACTIVE
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = self._try_token(interactive)
+        if wait:
+            waiter = self._waiting(interactive, f"{os.getpid()}:{threading.get_ident()}", timeout)
+            try:
+                while wait:
+                    if deadline is not None and time.monotonic() + wait > deadline:
+                        raise QuotaExceeded(f"Rate limit wait timed out ({priority})")
+                    time.sleep(wait)
+                    wait = self._try_token(interactive)
+            finally:
+                self._done_waiting(waiter)
+        self._charge(priority)
+
+    async def acquire_async(self, priority=PRIORITY_INTERACTIVE, timeout=None):
+        """
+        acquire() for coroutines: waits with asyncio.sleep so the event loop
+        keeps running, and counts the call in a worker thread.
+        """
+        interactive = priority == PRIORITY_INTERACTIVE
+        deadline = None if timeout is None else time.monotonic() + timeout
+        wait = await asyncio.to_thread(self._try_token, interactive)
+        if wait:
+            owner = f"{os.getpid()}:{id(asyncio.current_task())}"
+            waiter = await asyncio.to_thread(self._waiting, interactive, owner, timeout)
+            try:
+                while wait:
+                    if deadline is not None and time.monotonic() + wait > deadline:
+                        raise QuotaExceeded(f"Rate limit wait timed out ({priority})")
+                    await asyncio.sleep(wait)
+                    wait = await asyncio.to_thread(self._try_token, interactive)
+            finally:
+                await asyncio.to_thread(self._done_waiting, waiter)
+        await asyncio.to_thread(self._charge, priority)
+
+    def _charge(self, priority):
+        """Count one call against today's shared budget."""
+        if self._reserve_call:
+            limit = self.daily_limit if priority == PRIORITY_INTERACTIVE else self.background_limit
+            if not self._reserve_call(self.today(), limit):
+                raise QuotaExceeded(f"Daily Ticketmaster budget spent for {priority} calls (limit {limit})")
+
+    def _try_token(self, interactive):
+        """
+        Take a token and a shared slot now (0) or return the seconds to wait.
+        The local token is refunded if the shared slot is refused.
+        """
+        if interactive:
+            wait = self.bucket.try_acquire()
+        elif self._interactive_waiting:
+            wait = 1 / self.bucket.rate
+        else:
+            wait = self.bucket.try_acquire(reserve=1 if self.bucket.capacity > 1 else 0)
+        if wait or not self._reserve_slot:
+            return wait
+
+        now = time.time()
+        second = int(now)
+        rate = max(1, int(self.bucket.rate))
+        limit = rate if interactive or rate == 1 else rate - 1
+        try:
+            reserved = self._reserve_slot(second, limit, not interactive)
+        except BaseException:
+            self.bucket.refund()
+            raise
+        if reserved:
+            return 0
+        self.bucket.refund()
+        return second + 1 - now
+
+    def _waiting(self, interactive, owner, timeout):
+        """Mark an interactive caller as waiting, here and for other processes."""
+        if not interactive:
+            return None
+        with self._lock:
+            self._interactive_waiting += 1
+        if self._set_waiter:
+            self._set_waiter(owner, time.time() + (timeout if timeout is not None else 60))
+        return owner
+
+    def _done_waiting(self, owner):
+        if owner is None:
+            return
+        with self._lock:
+            self._interactive_waiting -= 1
+        if self._set_waiter:
+            try:
+                self._set_waiter(owner, None)
+            except Exception as e:
+                # The entry expires on its own
+                logger.debug(f"Could not clear quota waiter {owner}: {e}")
+
+    def throttled(self, retry_after=None):
+        """The API answered 429: stop handing out tokens for a while."""
+        try:
+            seconds = float(retry_after)
+        except (TypeError, ValueError):
+            seconds = 1.0
+        logger.warning(f"Ticketmaster throttled us (429); pausing calls for {seconds:.1f}s")
+        self.bucket.block(seconds)
+        if self._block_slots:
+            try:
+                self._block_slots(int(time.time()), math.ceil(seconds))
+            except Exception as e:
+                logger.warning(f"Could not share the 429 pause with other processes: {e}")
+
+    def status(self):
+        """Current quota headroom."""
+        used = self._get_usage(self.today()) if self._get_usage else 0
+        return {
+            "tokens": round(self.bucket.tokens, 2),
+            "rate_per_second": self.bucket.rate,
+            "daily_used": used,
+            "daily_limit": self.daily_limit,
+            "daily_remaining": max(0, self.daily_limit - used),
+            "background_remaining": max(0, self.background_limit - used)
+        }
@@ -0,0 +1,169 @@
+"""
+TicketWatch Resilience Helpers
+Retries with jittered backoff, a circuit breaker and hedged requests, so a
+Ticketmaster outage costs seconds instead of a whole watch cycle
+"""
+import time
+import random
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import wait, FIRST_COMPLETED
+
+logger = logging.getLogger(__name__)
+
+
+class ServiceUnavailable(Exception):
+    """The upstream service is failing; distinct from 'not found'."""
+
+
+class CircuitOpenError(ServiceUnavailable):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens when at least `min_calls` outcomes in the last `window` seconds
+    have a failure rate of `failure_rate` or more. While open every call
+    fails fast; after `cooldown` seconds one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_rate=0.5, min_calls=10, window=30, cooldown=30):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self.state = self.CLOSED
+        self._outcomes = deque()
+        self._opened_at = 0.0
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go ahead now."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                self.state = self.HALF_OPEN
+                self._trial_running = False
+            if self.state == self.HALF_OPEN and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def release(self):
+        """The allowed call never reached upstream (e.g. cancelled): free the trial slot."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit closed: upstream recovered")
+                self.state = self.CLOSED
+                self._outcomes.clear()
+            self._record(True)
+
+    def record_failure(self):
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._open()
+                return
+            self._record(False)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if (self.state == self.CLOSED and len(self._outcomes) >= self.min_calls
+                    and failures / len(self._outcomes) >= self.failure_rate):
+                self._open()
+
+    def _record(self, ok):
+        now = time.monotonic()
+        self._outcomes.append((now, ok))
+        while self._outcomes and now - self._outcomes[0][0] > self.window:
+            self._outcomes.popleft()
+
+    def _open(self):
+        logger.warning(f"Circuit opened: failing fast for {self.cooldown}s")
+        self.state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._trial_running = False
+
+
+class LatencyTracker:
+    """Rolling sample of recent call latencies (seconds)."""
+
+    def __init__(self, size=200):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct, min_samples=20):
+        """The pct-th percentile, or None until min_samples have been seen."""
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def retry_call(fn, is_transient, attempts=3, base_delay=0.5, max_delay=4.0):
+    """
+    Call fn(), retrying transient failures with full-jitter exponential
+    backoff. The last error is re-raised once attempts run out.
+    """
+    for attempt in range(attempts):
+        try:
+            return fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.debug(f"Transient error ({e}); retry {attempt + 1} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def retry_call_async(fn, is_transient, attempts=3, base_delay=0.5, max_delay=4.0):
+    """retry_call for coroutine functions; backs off with asyncio.sleep."""
+    for attempt in range(attempts):
+        try:
+            return await fn()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_transient(e):
+                raise
+            delay = random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+            logger.debug(f"Transient error ({e}); retry {attempt + 1} in {delay:.2f}s")
+            await asyncio.sleep(delay)
+
+
+def hedged_call(fn, hedge_after, executor):
+    """
+    Call fn() and, if it hasn't finished after hedge_after seconds, start
+    a second identical call; return whichever succeeds first.
+    With hedge_after None this is just fn().
+    """
+    if hedge_after is None:
+        return fn()
+    first = executor.submit(fn)
+    done, _ = wait([first], timeout=hedge_after)
+    if done:
+        return first.result()
+
+    logger.debug(f"Hedging request after {hedge_after:.2f}s")
+    second = executor.submit(fn)
+    pending = {first, second}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+    return first.result()  # Both failed: raise the original error
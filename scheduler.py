@@ -0,0 +1,64 @@
+"""
+TicketWatch Poll Scheduler
+Decides when each event is next checked, so API calls go to the events
+most likely to drop tickets instead of a fixed sweep of every watch
+"""
+import math
+from datetime import date, datetime
+from config import (
+    CHECK_INTERVAL_MINUTES, SCHEDULER_MIN_INTERVAL_MINUTES, SCHEDULER_MAX_INTERVAL_MINUTES,
+    SCHEDULER_HOT_MINUTES
+)
+
+
+def days_until(date_start, now=None):
+    """Days from now until the event date, or None if the date is unknown."""
+    if not date_start:
+        return None
+    try:
+        event_day = date.fromisoformat(str(date_start)[:10])
+    except ValueError:
+        return None
+    today = (now or datetime.now()).date()
+    return (event_day - today).days
+
+
+def compute_interval(date_start, watcher_count=1, last_change_at=None, now=None):
+    """
+    Seconds until an event should be checked again.
+
+    - Shows in the next couple of days are polled hardest, far-off ones rarely
+    - An event whose status or price changed recently is polled faster
+    - More watchers on an event shortens the interval (logarithmically)
+    """
+    now = now or datetime.now()
+    base = CHECK_INTERVAL_MINUTES
+    days = days_until(date_start, now)
+
+    if days is None:
+        minutes = base
+    elif days < 0:
+        minutes = SCHEDULER_MAX_INTERVAL_MINUTES  # Already happened
+    elif days <= 2:
+        minutes = base / 5
+    elif days <= 14:
+        minutes = base
+    elif days <= 60:
+        minutes = base * 3
+    else:
+        minutes = base * 6
+
+    if last_change_at:
+        try:
+            changed = datetime.fromisoformat(last_change_at)
+            if (now - changed).total_seconds() < SCHEDULER_HOT_MINUTES * 60:
+                minutes /= 2
+        except ValueError:
+            pass
+
+    if watcher_count and watcher_count > 1:
+        minutes /= 1 + math.log10(watcher_count)
+
+    minutes = max(SCHEDULER_MIN_INTERVAL_MINUTES, min(SCHEDULER_MAX_INTERVAL_MINUTES, minutes))
+    return minutes * 60
+
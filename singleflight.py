@@ -0,0 +1,91 @@
+"""
+TicketWatch Single-Flight
+Concurrent callers asking for the same key share one in-flight call
+instead of each going to the network; works across threads and asyncio
+"""
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, CancelledError
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """
+    The first caller for a key runs the call; callers arriving while it is
+    in flight wait for and share its result (or exception). Nothing is
+    remembered once the call finishes, so this never serves stale data.
+    Thread callers use do(), coroutines use do_async(); both can wait on
+    the same call.
+    """
+
+    def __init__(self):
+        self.shared = 0
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _join(self, key):
+        """Return (future, is_leader) for key."""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                self.shared += 1
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _finish(self, key, future):
+        with self._lock:
+            if self._calls.get(key) is future:
+                del self._calls[key]
+
+    def do(self, key, fn):
+        """Run fn() once for all concurrent callers of key."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                try:
+                    return future.result()
+                except CancelledError:
+                    continue  # An async leader was cancelled: take over the call
+            try:
+                result = fn()
+            except BaseException as e:
+                self._finish(key, future)
+                future.set_exception(e)
+                raise
+            self._finish(key, future)
+            future.set_result(result)
+            return result
+
+    async def do_async(self, key, fn):
+        """Await fn() once for all concurrent callers of key."""
+        while True:
+            future, leader = self._join(key)
+            if not leader:
+                # Shielded so a waiter being cancelled doesn't cancel the shared call
+                try:
+                    return await asyncio.shield(asyncio.wrap_future(future))
+                except asyncio.CancelledError:
+                    if future.cancelled():
+                        continue  # The leader was cancelled, not us: take over the call
+                    raise
+            try:
+                result = await fn()
+            except asyncio.CancelledError:
+                self._finish(key, future)
+                future.cancel()
+                raise
+            except BaseException as e:
+                self._finish(key, future)
+                future.set_exception(e)
+                raise
+            self._finish(key, future)
+            future.set_result(result)
+            return result
+
+    def stats(self):
+        with self._lock:
+            return {"in_flight": len(self._calls), "shared": self.shared}
@@ -110,7 +110,7 @@ def handle_webhook(payload, signature):
 
 def handle_subscription_created(event):
     """Handle new subscription."""
-    from database import get_db
+    from database import transaction
     
     data = event.get("data", {}).get("object", {})
     customer_id = data.get("customer")
@@ -122,18 +122,17 @@ def handle_subscription_created(event):
         return {"success": False}
     
     # Update user tier to premium
-    db = get_db()
-    db.execute(
-        """INSERT OR REPLACE INTO subscriptions 
-           (user_id, tier, stripe_customer_id, stripe_subscription_id, started_at, expires_at)
-           VALUES (?, ?, ?, ?, ?, ?)""",
-        (user_id, "premium", customer_id, subscription_id, datetime.now().isoformat(), None)
-    )
-    db.execute(
-        "UPDATE users SET tier = ? WHERE user_id = ?",
-        ("premium", user_id)
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute(
+            """INSERT OR REPLACE INTO subscriptions 
+               (user_id, tier, stripe_customer_id, stripe_subscription_id, started_at, expires_at)
+               VALUES (?, ?, ?, ?, ?, ?)""",
+            (user_id, "premium", customer_id, subscription_id, datetime.now().isoformat(), None)
+        )
+        db.execute(
+            "UPDATE users SET tier = ? WHERE user_id = ?",
+            ("premium", user_id)
+        )
     
     logger.info(f"Subscription created: {user_id} -> premium")
     return {"success": True}
@@ -141,7 +140,7 @@ def handle_subscription_created(event):
 
 def handle_subscription_deleted(event):
     """Handle subscription cancellation."""
-    from database import get_db
+    from database import transaction
     
     data = event.get("data", {}).get("object", {})
     subscription_id = data.get("id")
@@ -152,16 +151,15 @@ def handle_subscription_deleted(event):
         return {"success": False}
     
     # Revert user tier to free
-    db = get_db()
-    db.execute(
-        "UPDATE users SET tier = ? WHERE user_id = ?",
-        ("free", user_id)
-    )
-    db.execute(
-        "UPDATE subscriptions SET expires_at = ? WHERE stripe_subscription_id = ?",
-        (datetime.now().isoformat(), subscription_id)
-    )
-    db.commit()
+    with transaction() as db:
+        db.execute(
+            "UPDATE users SET tier = ? WHERE user_id = ?",
+            ("free", user_id)
+        )
+        db.execute(
+            "UPDATE subscriptions SET expires_at = ? WHERE stripe_subscription_id = ?",
+            (datetime.now().isoformat(), subscription_id)
+        )
     
     logger.info(f"Subscription deleted: {user_id} -> free")
     return {"success": True}
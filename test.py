@@ -88,6 +88,19 @@ def test_parser():
     
     print("✅ All parser tests passed")
 
+def test_scheduler():
+    """Test adaptive poll intervals."""
+    print("\n=== TEST: Poll Scheduler ===")
+    from datetime import date, timedelta
+    from scheduler import compute_interval
+
+    soon = (date.today() + timedelta(days=1)).isoformat()
+    far = (date.today() + timedelta(days=200)).isoformat()
+    assert compute_interval(soon) < compute_interval(far)
+    assert compute_interval(far, watcher_count=400) < compute_interval(far, watcher_count=1)
+    print(f"✅ Tomorrow every {compute_interval(soon):.0f}s, in 200 days every {compute_interval(far):.0f}s")
+    print("✅ PASS")
+
 def test_api():
     """Test Ticketmaster API."""
     print("\n=== TEST: Ticketmaster API ===")
@@ -103,6 +116,210 @@ def test_api():
     assert formatted['name']
     print("✅ PASS")
 
+def test_event_model():
+    """Test the Event record built from raw API JSON."""
+    print("\n=== TEST: Event Model ===")
+    from models import Event
+    event = Event.from_api({
+        "id": "E1", "name": "Test Gig",
+        "dates": {"start": {"localDate": "2026-05-01"}, "status": {"code": "onsale"}},
+        "priceRanges": [{"min": 40.0, "max": 90.0}]
+    })
+    assert event.venue == "TBA" and event.date == "2026-05-01"
+    assert event.fingerprint == "onsale|40.0|90.0"
+    assert Event.from_dict(event.to_dict()) == event
+    assert not hasattr(event, "__dict__")
+    print("✅ PASS")
+
+def test_single_flight():
+    """Test concurrent callers sharing one in-flight call."""
+    print("\n=== TEST: Single-Flight ===")
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+    from singleflight import SingleFlight
+    flight = SingleFlight()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        time.sleep(0.2)
+        return "result"
+
+    with ThreadPoolExecutor(4) as pool:
+        results = list(pool.map(lambda _: flight.do("key", slow), range(4)))
+    assert results == ["result"] * 4
+    assert len(calls) == 1
+    print("✅ PASS")
+
+def test_alert_outbox():
+    """Test claiming, acking and retrying outbox messages."""
+    print("\n=== TEST: Alert Outbox ===")
+    from database import enqueue_alert, claim_alerts, ack_alerts, nack_alert
+    sent = enqueue_alert("outboxtest", "first")
+    retried = enqueue_alert("outboxtest", "second")
+    claimed = {m["id"]: m for m in claim_alerts("tester", 100, 60, 3)}
+    assert claimed[sent]["message"] == "first" and claimed[sent]["attempts"] == 1
+    assert sent not in {m["id"] for m in claim_alerts("other", 100, 60, 3)}
+    assert ack_alerts("other", [sent]) == 0
+    assert ack_alerts("tester", [sent]) == 1
+    assert nack_alert("tester", retried, "timeout", 0, 3) == "pending"
+    again = {m["id"]: m for m in claim_alerts("tester", 100, 60, 3)}
+    assert retried in again and sent not in again
+    ack_alerts("tester", [retried])
+    print("✅ PASS")
+
+def test_price_history():
+    """Test price history rollups, retention and stitched series."""
+    print("\n=== TEST: Price History ===")
+    import time
+    from datetime import datetime
+    from database import CycleBatch
+    from price_history import maintain, get_price_series, HOUR, DAY
+    from config import PRICE_HISTORY_RAW_DAYS
+    db = get_db()
+    db.execute("INSERT OR IGNORE INTO events (event_id, name) VALUES ('historytest', 'History Test')")
+    for table in ("price_history", "price_history_hourly", "price_history_daily"):
+        db.execute(f"DELETE FROM {table} WHERE event_id='historytest'")
+    db.commit()
+
+    # Twelve samples in an hour that raw retention is about to cut in half,
+    # plus a few recent ones
+    now = int(time.time())
+    old_hour = now - now % HOUR - PRICE_HISTORY_RAW_DAYS * DAY
+    batch = CycleBatch()
+    for i in range(12):
+        batch.price_observed("historytest", "onsale", 40.0 + i, 100.0, ts=old_hour + i * 300)
+    for i in range(3):
+        batch.price_observed("historytest", "onsale", 30.0, 90.0, ts=now - i * 60)
+    batch.flush()
+
+    half_past = old_hour + PRICE_HISTORY_RAW_DAYS * DAY + 30 * 60
+    maintain(now=old_hour + 2 * HOUR)
+    maintain(now=half_past)  # deletes half the old hour's raw rows...
+    maintain(now=half_past)  # ...which must not shrink its bucket
+    bucket = db.execute(
+        "SELECT samples, price_min FROM price_history_hourly WHERE event_id='historytest' AND ts=?",
+        (old_hour,)
+    ).fetchone()
+    assert (bucket["samples"], bucket["price_min"]) == (12, 40.0)
+
+    # Once its raw rows are gone, the old hour comes from the hourly rollup
+    maintain(now=half_past + 90 * 60)
+    series = get_price_series("historytest", until=datetime.fromtimestamp(now + 1))
+    assert [p["resolution"] for p in series] == ["hourly", "raw", "raw", "raw"]
+    assert series[0]["samples"] == 12
+    assert [p["ts"] for p in series] == sorted(p["ts"] for p in series)
+    print("✅ PASS")
+
+def test_event_migration():
+    """Test moving watches onto the normalized events table, and leasing events."""
+    print("\n=== TEST: Events Migration ===")
+    import sqlite3
+    import tempfile
+    from pathlib import Path
+    import database
+    path = Path(tempfile.mkdtemp()) / "old.db"
+    conn = sqlite3.connect(str(path))
+    conn.row_factory = sqlite3.Row
+    for step in database.MIGRATIONS[:5]:
+        step(conn)
+    conn.execute("PRAGMA user_version = 5")
+    conn.execute("INSERT INTO users (user_id) VALUES ('a'), ('b')")
+    conn.executemany(
+        """INSERT INTO watches (user_id, event_id, event_name, venue, date_start, max_price,
+                                status, last_checked, buy_url) VALUES (?,?,?,?,?,?,?,?,?)""",
+        [("a", "E1", "Gig", "Venue", "2026-12-01", 50, "active", "2026-01-01T00:00:00", "url"),
+         ("b", "E1", "Gig", "Venue", "2026-12-01", None, "active", None, "url"),
+         ("b", "E2", "Other", "Hall", "2026-11-01", 30, "cancelled", None, "")]
+    )
+    conn.execute("INSERT INTO event_state (event_id, last_status, fingerprint) VALUES ('E1', 'onsale', 'x')")
+    conn.commit()
+
+    database.migrate(conn)
+    events = {row["event_id"]: dict(row) for row in conn.execute("SELECT * FROM events")}
+    assert events["E1"]["watcher_count"] == 2 and events["E2"]["watcher_count"] == 0
+    assert events["E1"]["fingerprint"] == "x" and events["E1"]["last_checked"] == "2026-01-01T00:00:00"
+    assert conn.execute("SELECT COUNT(*) FROM watch_details WHERE event_name='Gig'").fetchone()[0] == 2
+    conn.execute("UPDATE watches SET status='alerted' WHERE user_id='a'")
+    assert conn.execute("SELECT watcher_count FROM events WHERE event_id='E1'").fetchone()[0] == 1
+    assert conn.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+    conn.commit()
+    conn.close()
+
+    # E1 is due (never scheduled) and leased to one worker at a time; E2 has no watchers
+    old_path = database.DB_PATH
+    database.DB_PATH = path
+    try:
+        assert [e["event_id"] for e in database.claim_events("w1", 10, 60)] == ["E1"]
+        assert database.claim_events("w2", 10, 60) == []
+        batch = database.CycleBatch()
+        batch.release("w1", ["E1"])
+        batch.flush()
+        assert [e["event_id"] for e in database.claim_events("w2", 10, 60)] == ["E1"]
+    finally:
+        database.close_db()
+        database.DB_PATH = old_path
+    print("✅ PASS")
+
+def test_watch_cycle():
+    """Test a watcher cycle offline: lease, one bulk fetch, evaluate, flush, outbox."""
+    print("\n=== TEST: Watch Cycle ===")
+    import tempfile
+    import urllib.parse
+    from pathlib import Path
+    import database
+    import tm_api
+    import watcher
+
+    # Every id onsale from €40, except E4 which is off sale
+    def api_event(event_id):
+        return {
+            "id": event_id, "name": f"Gig {event_id}",
+            "dates": {"start": {"localDate": "2026-12-01"},
+                      "status": {"code": "offsale" if event_id == "E4" else "onsale"}},
+            "priceRanges": [{"min": 40.0, "max": 90.0}]
+        }
+
+    calls = []
+
+    def fake_fetch(url, priority=None, headers=None):
+        ids = urllib.parse.parse_qs(urllib.parse.urlsplit(url).query)["id"][0].split(",")
+        calls.append(ids)
+        body = {"_embedded": {"events": [api_event(event_id) for event_id in ids]}}
+        return 200, {}, json.dumps(body).encode()
+
+    old_path, old_demo = database.DB_PATH, tm_api.DEMO_MODE
+    old_fetch, old_disk = tm_api._fetch, tm_api.disk_cache
+    database.DB_PATH = Path(tempfile.mkdtemp()) / "cycle.db"
+    tm_api.DEMO_MODE, tm_api._fetch, tm_api.disk_cache = False, fake_fetch, None
+    try:
+        for user_id in ("c1", "c2"):
+            database.create_user(user_id, "+353")
+        # (user, event, max_price): c1 matches on E0 and E1; c2's targets are too low or off sale
+        watches = [("c1", "E0", 50), ("c2", "E0", 30), ("c1", "E1", None),
+                   ("c2", "E2", 10), ("c2", "E3", 20), ("c2", "E4", 100)]
+        ids = {(user_id, event_id): database.create_watch(user_id, event_id, f"Gig {event_id}", "Venue",
+                                                         "2026-12-01", max_price, 1, "")
+               for user_id, event_id, max_price in watches}
+
+        stats = watcher.check_all_watches(concurrency=2, worker_id="cycle-test")
+        assert len(calls) == 1 and sorted(calls[0]) == ["E0", "E1", "E2", "E3", "E4"]
+        assert stats["events"] == 5 and stats["alerts"] == 2 and stats["errors"] == 0
+        queued = {row["watch_id"] for row in database.get_db().execute("SELECT watch_id FROM alert_outbox")}
+        assert queued == {ids[("c1", "E0")], ids[("c1", "E1")]}
+        print(f"✅ One bulk request for 5 events, {len(queued)} alerts queued")
+
+        # Everything was rescheduled and released: nothing is due on an immediate re-run
+        stats = watcher.check_all_watches(concurrency=2, worker_id="cycle-test")
+        assert stats["events"] == 0 and len(calls) == 1
+        print("✅ Nothing due on re-run")
+    finally:
+        watcher._shutdown_executor()
+        database.close_db()
+        database.DB_PATH, tm_api.DEMO_MODE = old_path, old_demo
+        tm_api._fetch, tm_api.disk_cache = old_fetch, old_disk
+    print("✅ PASS")
+
 def test_database():
     """Test database."""
     print("\n=== TEST: Database ===")
@@ -135,6 +352,30 @@ def test_database():
     assert len(watches) > 0
     print(f"✅ Listed {len(watches)} watches")
 
+    # A write that fails on a locked database leaves no transaction behind
+    import sqlite3
+    import database
+    from database import purge_alert_outbox, claim_events
+    busy_timeout = database.DB_BUSY_TIMEOUT_MS
+    database.DB_BUSY_TIMEOUT_MS = 50
+    database.close_db()
+    other = sqlite3.connect(str(database.DB_PATH))
+    other.execute("BEGIN IMMEDIATE")
+    try:
+        try:
+            purge_alert_outbox(30)
+            assert False, "expected database is locked"
+        except sqlite3.OperationalError:
+            pass
+        assert not get_db().in_transaction
+    finally:
+        other.rollback()
+        other.close()
+        database.DB_BUSY_TIMEOUT_MS = busy_timeout
+        database.close_db()
+    claim_events("dbtest-worker", 1, 60)
+    print("✅ Failed write rolled back, connection still usable")
+
 def run_all_tests():
     """Run all tests."""
     print("\n" + "="*50)
@@ -145,6 +386,13 @@ def run_all_tests():
         test_database()
         test_api()
         test_parser()
+        test_scheduler()
+        test_event_model()
+        test_single_flight()
+        test_alert_outbox()
+        test_price_history()
+        test_event_migration()
+        test_watch_cycle()
         test_search()
         test_watch_creation()
         test_list_watches()
@@ -2,14 +2,131 @@
 Ticketmaster API Wrapper with Demo Mode
 """
 import json
+import time
 import logging
-import urllib.request
+import http.client
 import urllib.error
 import urllib.parse
-from config import TM_API_KEY, TM_BASE_URL, TM_COUNTRY_CODE, TM_CHECK_TIMEOUT, DEMO_MODE
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    TM_API_KEY, TM_BASE_URL, TM_COUNTRY_CODE, TM_CHECK_TIMEOUT, DEMO_MODE,
+    TM_RATE_LIMIT_PER_SECOND, TM_DAILY_QUOTA, TM_INTERACTIVE_RESERVE, TM_QUOTA_WAIT,
+    TM_POOL_SIZE, TM_EVENT_CACHE_TTL, TM_EVENT_CACHE_SIZE, TM_SEARCH_CACHE_TTL, TM_SEARCH_CACHE_SIZE,
+    TM_DISK_CACHE_ENABLED, TM_DISK_CACHE_PATH, TM_DISK_CACHE_SIZE, TM_VALIDATOR_TTL,
+    TM_BULK_BATCH_SIZE, TM_BULK_MAX_ID_CHARS, TM_RETRY_ATTEMPTS, TM_RETRY_BASE_DELAY,
+    TM_RETRY_MAX_DELAY, TM_BREAKER_FAILURE_RATE, TM_BREAKER_MIN_CALLS, TM_BREAKER_WINDOW,
+    TM_BREAKER_COOLDOWN, TM_HEDGE_ENABLED, TM_HEDGE_PERCENTILE, TM_CATALOG_ENABLED
+)
+import catalog
+from database import (
+    reserve_api_call, get_api_usage, reserve_api_slot, set_api_waiter, block_api_slots
+)
+from http_pool import ConnectionPool
+from models import Event
+from singleflight import SingleFlight
+from cache import TTLCache, DiskCache
+from quota import QuotaGovernor, QuotaExceeded, PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND
+from resilience import (
+    CircuitBreaker, CircuitOpenError, ServiceUnavailable, LatencyTracker, retry_call, hedged_call
+)
 
 logger = logging.getLogger(__name__)
 
+# Shared by every call in this process; the per-second window, interactive
+# waiters and daily count are shared across processes through the database
+governor = QuotaGovernor(
+    TM_RATE_LIMIT_PER_SECOND, TM_DAILY_QUOTA, TM_INTERACTIVE_RESERVE,
+    reserve_call=reserve_api_call, get_usage=get_api_usage,
+    reserve_slot=reserve_api_slot, set_waiter=set_api_waiter, block_slots=block_api_slots
+)
+
+# Keep-alive connections to the Discovery API, shared by all threads
+pool = ConnectionPool(TM_BASE_URL, size=TM_POOL_SIZE, timeout=TM_CHECK_TIMEOUT)
+
+# Recent responses, so repeat lookups within a TTL don't cost an API call.
+# The in-process tier is checked first, then the on-disk tier shared by
+# every process (handler invocations are one process per message).
+event_cache = TTLCache(maxsize=TM_EVENT_CACHE_SIZE, ttl=TM_EVENT_CACHE_TTL, name="event")
+search_cache = TTLCache(maxsize=TM_SEARCH_CACHE_SIZE, ttl=TM_SEARCH_CACHE_TTL, name="search")
+# ETag/Last-Modified plus the parsed event they describe, kept much longer
+# than the event cache so polls can be answered with 304 Not Modified
+validator_cache = TTLCache(maxsize=TM_EVENT_CACHE_SIZE, ttl=TM_VALIDATOR_TTL, name="validator")
+disk_cache = DiskCache(TM_DISK_CACHE_PATH, maxsize=TM_DISK_CACHE_SIZE) if TM_DISK_CACHE_ENABLED else None
+
+# Fail fast while Ticketmaster is down; latencies drive request hedging
+breaker = CircuitBreaker(
+    failure_rate=TM_BREAKER_FAILURE_RATE, min_calls=TM_BREAKER_MIN_CALLS,
+    window=TM_BREAKER_WINDOW, cooldown=TM_BREAKER_COOLDOWN
+)
+latencies = LatencyTracker()
+
+# Concurrent identical event/search requests share one API call
+flight = SingleFlight()
+_hedger = None
+
+
+def _cached(memory, key):
+    """Look a key up in the in-process cache, then the shared disk cache."""
+    value = memory.get(key)
+    if value is None:
+        value = _disk_lookup(memory, key)
+    return value
+
+
+def _disk_lookup(memory, key):
+    """Look a key up in the disk cache only, copying a hit into memory."""
+    if disk_cache is None:
+        return None
+    entry = disk_cache.get_entry(_disk_key(memory, key))
+    if not entry:
+        return None
+    value, ttl_left = entry
+    value = _from_disk(value)
+    memory.set(key, value, ttl=ttl_left)
+    return value
+
+
+def _store(memory, key, value):
+    _store_many([(memory, key, value)])
+
+
+def _store_many(entries):
+    """Cache (memory, key, value) entries, writing the disk tier in one transaction."""
+    for memory, key, value in entries:
+        memory.set(key, value)
+    if disk_cache is not None:
+        disk_cache.set_many(
+            (_disk_key(memory, key), _to_disk(value), memory.ttl) for memory, key, value in entries
+        )
+
+
+def _to_disk(value):
+    """Make a cached value JSON-safe; Events are tagged so they round-trip."""
+    if isinstance(value, Event):
+        return {"__event__": value.to_dict()}
+    if isinstance(value, list):
+        return [_to_disk(item) for item in value]
+    if isinstance(value, dict):
+        return {k: _to_disk(v) for k, v in value.items()}
+    return value
+
+
+def _from_disk(value):
+    if isinstance(value, list):
+        return [_from_disk(item) for item in value]
+    if isinstance(value, dict):
+        if "__event__" in value:
+            return Event.from_dict(value["__event__"])
+        return {k: _from_disk(v) for k, v in value.items()}
+    return value
+
+
+def _disk_key(memory, key):
+    if isinstance(key, tuple):
+        key = "|".join(str(part) for part in key)
+    return f"{memory.name}:{key}"
+
 # Mock data for testing without API key
 MOCK_EVENTS = [
     {
@@ -48,20 +165,201 @@ MOCK_EVENTS = [
 ]
 
 
-def search_events(query, city=None, size=10):
+def cache_stats():
+    """Hit/miss counts and sizes of the response caches."""
+    return {
+        "events": event_cache.stats(),
+        "searches": search_cache.stats(),
+        "disk": disk_cache.stats() if disk_cache is not None else None,
+        "single_flight": flight.stats()
+    }
+
+
+def invalidate_cache(event_id=None):
+    """Forget one cached event, or every cached event and search (both tiers)."""
+    event_cache.invalidate(event_id)
+    validator_cache.invalidate(event_id)
+    if event_id is None:
+        search_cache.invalidate()
+    if disk_cache is not None:
+        if event_id is None:
+            disk_cache.invalidate()
+        else:
+            disk_cache.invalidate(_disk_key(event_cache, event_id))
+            disk_cache.invalidate(_disk_key(validator_cache, event_id))
+
+
+def quota_status():
+    """Ticketmaster quota headroom (tokens, daily used/remaining)."""
+    return governor.status()
+
+
+def _fetch(url, priority=PRIORITY_INTERACTIVE, headers=None):
+    """
+    GET a Discovery API URL under the quota governor over the shared
+    keep-alive pool. Returns (status, headers, body) for 2xx/3xx.
+    Transient failures (timeouts, connection errors, 429/5xx) are retried
+    with jittered backoff, optionally hedged, and feed the circuit breaker.
+    Raises QuotaExceeded without calling the API if the quota is spent,
+    ServiceUnavailable (CircuitOpenError while the breaker is open) when
+    Ticketmaster is failing, and urllib.error.HTTPError for other error
+    statuses.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = f"{parts.path}?{parts.query}"
+
+    def attempt():
+        if not breaker.allow():
+            raise CircuitOpenError("Ticketmaster circuit open")
+        # Until the request is sent, any failure (quota refused, the usage
+        # store locked, ...) must free a half-open trial slot
+        try:
+            governor.acquire(priority, timeout=TM_QUOTA_WAIT)
+        except BaseException:
+            breaker.release()
+            raise
+        started = time.monotonic()
+        try:
+            status, reason, resp_headers, body = pool.request("GET", path, headers)
+        except Exception:
+            breaker.record_failure()
+            raise
+        _check_response(url, status, reason, resp_headers, started)
+        return status, resp_headers, body
+
+    def hedged_attempt():
+        return hedged_call(attempt, _hedge_delay(), _hedge_executor())
+
+    try:
+        return retry_call(hedged_attempt, _is_transient, attempts=TM_RETRY_ATTEMPTS,
+                          base_delay=TM_RETRY_BASE_DELAY, max_delay=TM_RETRY_MAX_DELAY)
+    except ServiceUnavailable:
+        raise
+    except Exception as e:
+        if _is_transient(e):
+            raise ServiceUnavailable(f"Ticketmaster request failed: {e}") from e
+        raise
+
+
+def _check_response(url, status, reason, resp_headers, started):
+    """Feed a response to the breaker and latency stats; raise HTTPError for 4xx/5xx."""
+    if status >= 500:
+        breaker.record_failure()
+        raise urllib.error.HTTPError(url, status, reason, resp_headers, None)
+    # Any other answer means Ticketmaster itself is up
+    breaker.record_success()
+    if status >= 400:
+        if status == 429:
+            governor.throttled(resp_headers.get("Retry-After"))
+        raise urllib.error.HTTPError(url, status, reason, resp_headers, None)
+    latencies.record(time.monotonic() - started)
+
+
+def _is_transient(error):
+    """Worth retrying: throttling, server errors, timeouts and dropped connections."""
+    if isinstance(error, urllib.error.HTTPError):
+        return error.code == 429 or error.code >= 500
+    return isinstance(error, (OSError, EOFError, http.client.HTTPException))
+
+
+def _hedge_delay():
+    """Seconds to wait before hedging, or None when hedging is off or unwarmed."""
+    if not TM_HEDGE_ENABLED:
+        return None
+    return latencies.percentile(TM_HEDGE_PERCENTILE)
+
+
+def _hedge_executor():
+    global _hedger
+    if _hedger is None:
+        _hedger = ThreadPoolExecutor(max_workers=TM_POOL_SIZE, thread_name_prefix="tm-hedge")
+    return _hedger
+
+
+def resilience_status():
+    """Circuit breaker state and recent latency percentiles."""
+    return {
+        "circuit": breaker.state,
+        "latency_p50": latencies.percentile(50),
+        "latency_p95": latencies.percentile(95),
+        "hedging": TM_HEDGE_ENABLED
+    }
+
+
+def _fetch_json(url, priority=PRIORITY_INTERACTIVE):
+    """GET a Discovery API URL and parse the JSON body."""
+    _, _, body = _fetch(url, priority)
+    return json.loads(body.decode())
+
+
+def _fetch_event(event_id, url, priority):
+    """
+    Fetch one event, conditionally if we hold validators from a previous
+    response. A 304 returns the stored parsed event without re-downloading
+    or re-parsing it.
+    """
+    validators, headers = _conditional_headers(event_id)
+    status, resp_headers, body = _fetch(url, priority, headers)
+    return _event_from_response(event_id, validators, status, resp_headers, body)
+
+
+def _conditional_headers(event_id):
+    """Stored validators for an event and the request headers they make."""
+    validators = _cached(validator_cache, event_id)
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return validators, headers
+
+
+def _event_from_response(event_id, validators, status, resp_headers, body):
+    """Parse an event response (or reuse the stored event on 304) and keep its validators."""
+    if status == 304 and validators:
+        logger.debug(f"Event {event_id} not modified")
+        event = validators["event"]
+    else:
+        event = Event.from_api(json.loads(body.decode()))
+
+    etag, last_modified = resp_headers.get("ETag"), resp_headers.get("Last-Modified")
+    if etag or last_modified:
+        _store(validator_cache, event_id, {"etag": etag, "last_modified": last_modified, "event": event})
+    return event
+
+
+def search_events(query, city=None, size=10, priority=PRIORITY_INTERACTIVE, use_cache=True):
     """
     Search Ticketmaster for Irish events.
-    Returns list of event dicts.
+    Returns a list of Events. Answered from the local catalog while it
+    is fresh (see catalog.py); otherwise API results are cached for
+    TM_SEARCH_CACHE_TTL, and each event found also warms the event cache.
+    Raises QuotaExceeded if the Ticketmaster quota is spent, and
+    ServiceUnavailable if Ticketmaster is failing (as opposed to not found).
     """
     if DEMO_MODE:
         logger.info(f"DEMO MODE: Searching for '{query}'")
-        # Filter mock data by keyword
-        query_lower = query.lower()
-        results = [e for e in MOCK_EVENTS if query_lower in e["name"].lower()]
-        if not results:
-            results = MOCK_EVENTS[:3]  # Return some defaults
-        return results
+        return _mock_search(query)
 
+    url = _search_url(query, size)
+    cache_key = _search_key(query, city, size)
+    if use_cache:
+        cached = _cached(search_cache, cache_key)
+        if cached is not None:
+            logger.debug(f"Search cache hit for '{query}'")
+            return list(cached)
+
+    if TM_CATALOG_ENABLED:
+        events = _search_catalog(query, city, size)
+        if events:
+            logger.info(f"Found {len(events)} catalog events for '{query}'")
+            return events
+
+    return list(flight.do(("search", *cache_key), lambda: _load_search(query, url, cache_key, priority)))
+
+
+def _search_url(query, size):
     params = urllib.parse.urlencode({
         "apikey": TM_API_KEY,
         "keyword": query,
@@ -69,103 +367,324 @@ def search_events(query, city=None, size=10):
         "size": size,
         "sort": "date,asc"
     })
-    url = f"{TM_BASE_URL}/events.json?{params}"
+    return f"{TM_BASE_URL}/events.json?{params}"
+
 
+def _search_key(query, city, size):
+    return (query.strip().lower(), city, size)
+
+
+def _load_search(query, url, cache_key, priority):
+    """Run a search against the API and cache its results."""
     try:
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=TM_CHECK_TIMEOUT) as resp:
-            data = json.loads(resp.read().decode())
-        events = data.get("_embedded", {}).get("events", [])
-        logger.info(f"Found {len(events)} events for '{query}'")
-        return events
+        return _search_results(query, cache_key, _fetch_json(url, priority))
+    except (QuotaExceeded, ServiceUnavailable):
+        raise
     except urllib.error.HTTPError as e:
-        logger.error(f"API Error: {e.code} {e.reason}")
+        if e.code == 429:
+            logger.warning(f"Throttled searching for '{query}'")
+        else:
+            logger.error(f"API Error: {e.code} {e.reason}")
         return []
     except Exception as e:
         logger.error(f"API Error: {e}")
         return []
 
 
-def get_event(event_id):
+def _search_results(query, cache_key, data):
+    """Events from a search response, stored in the search and event caches."""
+    events = [Event.from_api(e) for e in data.get("_embedded", {}).get("events", [])]
+    logger.info(f"Found {len(events)} events for '{query}'")
+    _store_many([(search_cache, cache_key, events)]
+                + [(event_cache, event.id, event) for event in events if event.id])
+    return events
+
+
+def _search_catalog(query, city, size):
+    """Catalog matches for a search, or [] if the catalog is stale or unusable."""
+    try:
+        if catalog.is_fresh():
+            return catalog.search(query, city=city, limit=size)
+    except Exception as e:
+        logger.warning(f"Catalog search failed, using the API: {e}")
+    return []
+
+
+# The Discovery API refuses pages beyond this many results (page * size)
+_MAX_RESULT_DEPTH = 1000
+
+
+def discover_events(page=0, size=200, start=None, end=None, keyword=None,
+                    priority=PRIORITY_BACKGROUND):
+    """
+    One page of TM_COUNTRY_CODE events, optionally limited to start..end
+    (aware datetimes) and a keyword.
+    Returns (events, page_info) where page_info is the API's page object
+    (number, size, totalElements, totalPages).
+    """
+    params = {
+        "apikey": TM_API_KEY,
+        "countryCode": TM_COUNTRY_CODE,
+        "page": page,
+        "size": size,
+        "sort": "date,asc"
+    }
+    if start:
+        params["startDateTime"] = start.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if end:
+        params["endDateTime"] = end.strftime("%Y-%m-%dT%H:%M:%SZ")
+    if keyword:
+        params["keyword"] = keyword
+    data = _fetch_json(f"{TM_BASE_URL}/events.json?{urllib.parse.urlencode(params)}", priority)
+    events = [Event.from_api(e) for e in data.get("_embedded", {}).get("events", [])]
+    return events, data.get("page", {})
+
+
+def iter_events(keyword=None, start=None, end=None, size=200, priority=PRIORITY_BACKGROUND):
+    """
+    Lazily yield every TM_COUNTRY_CODE Event matching keyword/start..end,
+    page by page. The next page is fetched in the background while the
+    caller works through the current one, so at most two pages are held
+    in memory however many events match.
+
+    The Discovery API only pages 1000 results deep; a date range with more
+    matches than that is split in half until each part fits. A range that
+    can't be split further (an hour or less, or no range at all) stops at
+    that depth with a warning and sets the returned EventStream's
+    truncated flag, so callers can tell they didn't see everything.
+    API errors (QuotaExceeded, ServiceUnavailable, HTTPError) propagate.
     """
-    Get detailed info about a specific event.
+    return EventStream(keyword, start, end, size, priority)
+
+
+class EventStream:
+    """Iterator returned by iter_events; truncated is set once any window hit the paging limit."""
+
+    def __init__(self, keyword, start, end, size, priority):
+        self.keyword = keyword
+        self.size = size
+        self.priority = priority
+        self.truncated = False
+        self._events = self._walk(start, end)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._events)
+
+    def close(self):
+        self._events.close()
+
+    def _walk(self, start, end):
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="tm-pages") as prefetcher:
+            yield from self._window(prefetcher, start, end)
+
+    def _fetch_page(self, prefetcher, page, start, end):
+        return prefetcher.submit(discover_events, page, self.size, start, end, self.keyword, self.priority)
+
+    def _window(self, prefetcher, start, end):
+        page = 0
+        pending = self._fetch_page(prefetcher, page, start, end)
+        while pending is not None:
+            events, page_info = pending.result()
+            if (page == 0 and page_info.get("totalElements", 0) > _MAX_RESULT_DEPTH
+                    and start and end and end - start > timedelta(hours=1)):
+                middle = start + (end - start) / 2
+                logger.debug(f"Splitting {start:%Y-%m-%d %H:%M}..{end:%Y-%m-%d %H:%M} "
+                             f"({page_info['totalElements']} events)")
+                yield from self._window(prefetcher, start, middle)
+                yield from self._window(prefetcher, middle + timedelta(seconds=1), end)
+                return
+
+            page += 1
+            pending = None
+            if page < page_info.get("totalPages", 0):
+                if (page + 1) * self.size <= _MAX_RESULT_DEPTH:
+                    pending = self._fetch_page(prefetcher, page, start, end)
+                else:
+                    self.truncated = True
+                    logger.warning(f"Stopped after {page * self.size} of {page_info.get('totalElements')} "
+                                   f"events (Discovery API paging limit)")
+            yield from events
+
+
+def get_event(event_id, priority=PRIORITY_INTERACTIVE, use_cache=True):
+    """
+    Get detailed info about a specific event as an Event (None if not found).
+    Served from the event cache when fresh (TM_EVENT_CACHE_TTL); pass
+    use_cache=False to force a fetch, which still refreshes the cache.
+    Callers asking for the same event at once share one request.
+    Raises QuotaExceeded if the Ticketmaster quota is spent, and
+    ServiceUnavailable if Ticketmaster is failing (as opposed to not found).
     """
     if DEMO_MODE:
         logger.info(f"DEMO MODE: Getting event {event_id}")
-        for e in MOCK_EVENTS:
-            if e["id"] == event_id:
-                return e
-        return None
+        return _mock_event(event_id)
+
+    url = _event_url(event_id)
+
+    if use_cache:
+        cached = _cached(event_cache, event_id)
+        if cached is not None:
+            logger.debug(f"Event cache hit for {event_id}")
+            return cached
+
+    return flight.do(("event", event_id), lambda: _load_event(event_id, url, priority))
+
 
+def _event_url(event_id):
     params = urllib.parse.urlencode({"apikey": TM_API_KEY})
-    url = f"{TM_BASE_URL}/events/{event_id}.json?{params}"
+    return f"{TM_BASE_URL}/events/{event_id}.json?{params}"
 
+
+def _load_event(event_id, url, priority):
+    """
+    Fetch one event from the API and cache it; None only on a 404.
+    Every other failure raises ServiceUnavailable (or QuotaExceeded).
+    """
     try:
-        req = urllib.request.Request(url)
-        with urllib.request.urlopen(req, timeout=TM_CHECK_TIMEOUT) as resp:
-            event = json.loads(resp.read().decode())
+        event = _fetch_event(event_id, url, priority)
         logger.info(f"Retrieved event {event_id}")
+        _store(event_cache, event_id, event)
         return event
+    except (QuotaExceeded, ServiceUnavailable):
+        raise
     except urllib.error.HTTPError as e:
-        logger.error(f"API Error for {event_id}: {e.code}")
-        return None
+        if e.code == 404:
+            logger.info(f"Event {event_id} not found")
+            return None
+        raise ServiceUnavailable(f"Ticketmaster error {e.code} for event {event_id}") from e
     except Exception as e:
-        logger.error(f"API Error: {e}")
-        return None
+        # Anything else (the cache or usage store failing, a bad body) isn't "not found"
+        raise ServiceUnavailable(f"Fetching event {event_id} failed: {e}") from e
 
 
-def format_event(event):
+def get_events(event_ids, priority=PRIORITY_INTERACTIVE, use_cache=True):
     """
-    Convert raw event data to friendly format.
+    Get many events with as few requests as possible: ids are looked up
+    through events.json in URL-safe batches (TM_BULK_BATCH_SIZE ids each).
+    Returns {event_id: Event}. Ids mapped to None were not found; ids
+    missing from the dict could not be fetched (API error or quota spent).
     """
-    if not event:
-        return None
+    event_ids = list(dict.fromkeys(event_ids))
+    if DEMO_MODE:
+        logger.info(f"DEMO MODE: Getting {len(event_ids)} events")
+        return {event_id: _mock_event(event_id) for event_id in event_ids}
 
-    venue_name = "TBA"
-    city_name = ""
-    if "_embedded" in event and "venues" in event["_embedded"]:
-        venues = event["_embedded"]["venues"]
-        if venues:
-            venue_name = venues[0].get("name", "TBA")
-            city_name = venues[0].get("city", {}).get("name", "")
+    results = {}
+    if use_cache:
+        for event_id in event_ids:
+            cached = _cached(event_cache, event_id)
+            if cached is not None:
+                results[event_id] = cached
 
-    dates = event.get("dates", {}).get("start", {})
-    date_str = dates.get("localDate", "TBA")
-    time_str = dates.get("localTime", "")
+    for batch in id_batches([event_id for event_id in event_ids if event_id not in results]):
+        try:
+            found = _fetch_event_batch(batch, priority)
+        except (QuotaExceeded, ServiceUnavailable) as e:
+            logger.warning(f"Bulk event fetch stopped: {e}")
+            break
+        except urllib.error.HTTPError as e:
+            logger.error(f"API Error for {len(batch)} events: {e.code}")
+            continue
+        except Exception as e:
+            logger.error(f"API Error for {len(batch)} events: {e}")
+            continue
+        for event_id in batch:
+            results[event_id] = found.get(event_id)
+    return results
 
-    price_min = None
-    price_max = None
-    if "priceRanges" in event and event["priceRanges"]:
-        price_min = event["priceRanges"][0].get("min")
-        price_max = event["priceRanges"][0].get("max")
 
-    status = event.get("dates", {}).get("status", {}).get("code", "unknown")
+def id_batches(event_ids, size=None):
+    """Split ids into batches that fit one events.json request."""
+    size = size or TM_BULK_BATCH_SIZE
+    batch, chars = [], 0
+    for event_id in event_ids:
+        if batch and (len(batch) >= size or chars + len(event_id) + 1 > TM_BULK_MAX_ID_CHARS):
+            yield batch
+            batch, chars = [], 0
+        batch.append(event_id)
+        chars += len(event_id) + 1
+    if batch:
+        yield batch
+
+
+def _fetch_event_batch(event_ids, priority):
+    """One events.json request for a batch of ids; returns {id: event} for those found."""
+    params = urllib.parse.urlencode({
+        "apikey": TM_API_KEY,
+        "id": ",".join(event_ids),
+        "size": len(event_ids),
+        "includeTBA": "yes",
+        "includeTBD": "yes"
+    }, safe=",")
+    data = _fetch_json(f"{TM_BASE_URL}/events.json?{params}", priority)
+    found = {}
+    for raw in data.get("_embedded", {}).get("events", []):
+        event = Event.from_api(raw)
+        found[event.id] = event
+    _store_many([(event_cache, event_id, event) for event_id, event in found.items()])
+    logger.info(f"Retrieved {len(found)}/{len(event_ids)} events in one request")
+    return found
+
+
+def _mock_search(query):
+    # Filter mock data by keyword
+    query_lower = query.lower()
+    results = [e for e in MOCK_EVENTS if query_lower in e["name"].lower()]
+    if not results:
+        results = MOCK_EVENTS[:3]  # Return some defaults
+    return [Event.from_api(e) for e in results]
 
-    return {
-        "id": event.get("id"),
-        "name": event.get("name"),
-        "venue": venue_name,
-        "city": city_name,
-        "date": date_str,
-        "time": time_str,
-        "price_min": price_min,
-        "price_max": price_max,
-        "status": status,
-        "url": event.get("url", "")
-    }
 
+def _mock_event(event_id):
+    for e in MOCK_EVENTS:
+        if e["id"] == event_id:
+            return Event.from_api(e)
+    return None
 
-def check_availability(event_id, max_price=None, quantity=1):
+
+def format_event(event):
+    """
+    Convert an Event to a plain dict (id, name, venue, city, date, time,
+    price_min, price_max, status, url) for responses and JSON output.
+    """
+    if not event:
+        return None
+    return event.to_dict()
+
+
+def event_fingerprint(event):
+    """
+    Compact fingerprint of the fields that decide availability
+    (status, min/max price). Equal fingerprints mean no watch on the
+    event can have changed outcome.
+    """
+    if not event:
+        return "not_found"
+    return event.fingerprint
+
+
+def check_availability(event_id, max_price=None, quantity=1, priority=PRIORITY_INTERACTIVE):
     """
     Check if event has available tickets at target price.
     Returns: {"available": bool, "price": float, "status": str, "details": str}
     """
-    event = get_event(event_id)
+    return evaluate_availability(get_event(event_id, priority), max_price, quantity)
+
+
+def evaluate_availability(event, max_price=None, quantity=1):
+    """
+    Evaluate an already-fetched event against a watch's target price.
+    Lets callers fetch an event once and check many watches against it.
+    Returns the same shape as check_availability.
+    """
     if not event:
         return {"available": False, "status": "not_found", "details": "Event not found"}
 
-    event_status = event.get("dates", {}).get("status", {}).get("code", "unknown")
-    
+    event_status = event.status
+
     if event_status != "onsale":
         return {
             "available": False,
@@ -173,16 +692,15 @@ def check_availability(event_id, max_price=None, quantity=1):
             "details": f"Event status: {event_status}"
         }
 
-    price_ranges = event.get("priceRanges", [])
-    if not price_ranges:
+    if event.price_min is None and event.price_max is None:
         return {
             "available": False,
             "status": "no_pricing",
             "details": "No pricing information available"
         }
 
-    min_price = price_ranges[0].get("min")
-    max_available = price_ranges[0].get("max")
+    min_price = event.price_min
+    max_available = event.price_max
 
     if max_price and min_price:
         if min_price <= max_price:
@@ -0,0 +1,191 @@
+"""
+TicketWatch Async Ticketmaster Client
+asyncio versions of search_events, get_event and check_availability with
+the same return shapes as tm_api. Many requests share one event loop over
+keep-alive connections; the caches, quota, circuit breaker and
+single-flight are shared with the blocking client.
+"""
+import json
+import time
+import asyncio
+import logging
+import weakref
+import urllib.error
+import urllib.parse
+from config import (
+    TM_BASE_URL, TM_CHECK_TIMEOUT, DEMO_MODE, TM_ASYNC_POOL_SIZE, TM_QUOTA_WAIT,
+    TM_RETRY_ATTEMPTS, TM_RETRY_BASE_DELAY, TM_RETRY_MAX_DELAY, TM_CATALOG_ENABLED
+)
+import tm_api
+from tm_api import (
+    governor, breaker, flight, event_cache, search_cache, evaluate_availability,
+    _check_response, _is_transient
+)
+from http_pool import AsyncConnectionPool
+from quota import QuotaExceeded, PRIORITY_INTERACTIVE
+from resilience import CircuitOpenError, ServiceUnavailable, retry_call_async
+
+logger = logging.getLogger(__name__)
+
+# Streams belong to the loop that opened them, so each loop gets its own pool
+_pools = weakref.WeakKeyDictionary()
+
+
+def _pool():
+    loop = asyncio.get_running_loop()
+    pool = _pools.get(loop)
+    if pool is None:
+        pool = _pools[loop] = AsyncConnectionPool(TM_BASE_URL, size=TM_ASYNC_POOL_SIZE,
+                                                  timeout=TM_CHECK_TIMEOUT)
+    return pool
+
+
+async def close():
+    """Close this event loop's idle connections (call before the loop ends)."""
+    pool = _pools.pop(asyncio.get_running_loop(), None)
+    if pool is not None:
+        await pool.close()
+
+
+async def _cached(memory, key):
+    """Memory hit inline; the disk tier is read in a worker thread."""
+    value = memory.get(key)
+    if value is None:
+        value = await asyncio.to_thread(tm_api._disk_lookup, memory, key)
+    return value
+
+
+async def _fetch(url, priority=PRIORITY_INTERACTIVE, headers=None, timeout=None):
+    """
+    tm_api._fetch for coroutines: same quota, breaker, retries and errors.
+    timeout bounds each attempt (default TM_CHECK_TIMEOUT). Cancelling the
+    caller abandons the request without counting against the breaker.
+    """
+    parts = urllib.parse.urlsplit(url)
+    path = f"{parts.path}?{parts.query}"
+
+    async def attempt():
+        if not breaker.allow():
+            raise CircuitOpenError("Ticketmaster circuit open")
+        try:
+            await governor.acquire_async(priority, timeout=TM_QUOTA_WAIT)
+        except BaseException:
+            breaker.release()
+            raise
+        started = time.monotonic()
+        try:
+            status, reason, resp_headers, body = await _pool().request("GET", path, headers, timeout)
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception:
+            breaker.record_failure()
+            raise
+        _check_response(url, status, reason, resp_headers, started)
+        return status, resp_headers, body
+
+    try:
+        return await retry_call_async(attempt, _is_transient, attempts=TM_RETRY_ATTEMPTS,
+                                      base_delay=TM_RETRY_BASE_DELAY, max_delay=TM_RETRY_MAX_DELAY)
+    except ServiceUnavailable:
+        raise
+    except Exception as e:
+        if _is_transient(e):
+            raise ServiceUnavailable(f"Ticketmaster request failed: {e}") from e
+        raise
+
+
+async def search_events(query, city=None, size=10, priority=PRIORITY_INTERACTIVE,
+                        use_cache=True, timeout=None):
+    """
+    Async tm_api.search_events: a list of Events, from the search cache,
+    the local catalog or the API. Raises QuotaExceeded / ServiceUnavailable
+    like the blocking version.
+    """
+    if DEMO_MODE:
+        logger.info(f"DEMO MODE: Searching for '{query}'")
+        return tm_api._mock_search(query)
+
+    url = tm_api._search_url(query, size)
+    cache_key = tm_api._search_key(query, city, size)
+    if use_cache:
+        cached = await _cached(search_cache, cache_key)
+        if cached is not None:
+            logger.debug(f"Search cache hit for '{query}'")
+            return list(cached)
+
+    if TM_CATALOG_ENABLED:
+        events = await asyncio.to_thread(tm_api._search_catalog, query, city, size)
+        if events:
+            logger.info(f"Found {len(events)} catalog events for '{query}'")
+            return events
+
+    return list(await flight.do_async(
+        ("search", *cache_key), lambda: _load_search(query, url, cache_key, priority, timeout)
+    ))
+
+
+async def _load_search(query, url, cache_key, priority, timeout):
+    try:
+        _, _, body = await _fetch(url, priority, timeout=timeout)
+        data = json.loads(body.decode())
+        return await asyncio.to_thread(tm_api._search_results, query, cache_key, data)
+    except (QuotaExceeded, ServiceUnavailable):
+        raise
+    except urllib.error.HTTPError as e:
+        if e.code == 429:
+            logger.warning(f"Throttled searching for '{query}'")
+        else:
+            logger.error(f"API Error: {e.code} {e.reason}")
+        return []
+    except Exception as e:
+        logger.error(f"API Error: {e}")
+        return []
+
+
+async def get_event(event_id, priority=PRIORITY_INTERACTIVE, use_cache=True, timeout=None):
+    """
+    Async tm_api.get_event: an Event, or None if not found. Raises like
+    the sync version. Uses conditional requests and shares in-flight
+    fetches with both clients.
+    """
+    if DEMO_MODE:
+        logger.info(f"DEMO MODE: Getting event {event_id}")
+        return tm_api._mock_event(event_id)
+
+    if use_cache:
+        cached = await _cached(event_cache, event_id)
+        if cached is not None:
+            logger.debug(f"Event cache hit for {event_id}")
+            return cached
+
+    return await flight.do_async(("event", event_id), lambda: _load_event(event_id, priority, timeout))
+
+
+async def _load_event(event_id, priority, timeout):
+    try:
+        validators, headers = await asyncio.to_thread(tm_api._conditional_headers, event_id)
+        status, resp_headers, body = await _fetch(tm_api._event_url(event_id), priority, headers, timeout)
+        event = await asyncio.to_thread(
+            tm_api._event_from_response, event_id, validators, status, resp_headers, body
+        )
+        logger.info(f"Retrieved event {event_id}")
+        await asyncio.to_thread(tm_api._store, event_cache, event_id, event)
+        return event
+    except (QuotaExceeded, ServiceUnavailable):
+        raise
+    except urllib.error.HTTPError as e:
+        if e.code == 404:
+            logger.info(f"Event {event_id} not found")
+            return None
+        raise ServiceUnavailable(f"Ticketmaster error {e.code} for event {event_id}") from e
+    except Exception as e:
+        # Anything else (the cache or usage store failing, a bad body) isn't "not found"
+        raise ServiceUnavailable(f"Fetching event {event_id} failed: {e}") from e
+
+
+async def check_availability(event_id, max_price=None, quantity=1, priority=PRIORITY_INTERACTIVE,
+                             timeout=None):
+    """Async tm_api.check_availability; same result dict."""
+    event = await get_event(event_id, priority, timeout=timeout)
+    return evaluate_availability(event, max_price, quantity)
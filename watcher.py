@@ -1,44 +1,269 @@
 """
 TicketWatch Checker
-Cron job that runs every 5 minutes to check all active watches
+Cron job that runs every 5 minutes to check all active watches,
+or a resident daemon (--daemon) that polls events as they fall due
 """
+import os
 import json
+import time
+import signal
+import socket
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
 from datetime import datetime
-from database import get_active_watches, update_watch_status, record_alert, get_user
-from tm_api import check_availability
-from alerts import send_alert
+from config import (
+    WATCHER_CONCURRENCY, WATCHER_CYCLE_TIMEOUT, WATCHER_LEASE_BATCH, WATCHER_LEASE_SECONDS,
+    DAEMON_MIN_SLEEP, DAEMON_MAX_SLEEP, DAEMON_HOUSEKEEPING_INTERVAL, PRICE_HISTORY_ENABLED,
+    ALERT_OUTBOX_KEEP_DAYS
+)
+from database import (
+    claim_events, get_event_watches, update_watch_status, record_alert, get_user,
+    get_next_check_at, purge_alert_outbox, CycleBatch, start_checkpointer
+)
+from tm_api import get_event, get_events, id_batches, evaluate_availability, event_fingerprint
+from quota import PRIORITY_BACKGROUND
+from alerts import format_alert_message
+from scheduler import compute_interval
+import price_history
 
 logger = logging.getLogger(__name__)
 
+# Sentinels: check_single_watch fetches the event itself / an event fetch failed
+_FETCH = object()
+_FAILED = object()
 
-def check_all_watches():
+# check_single_watch outcomes
+ALERT_SENT = "sent"
+ALERT_FAILED = "failed"
+
+# Callbacks for event status/price changes (see add_change_listener)
+_change_listeners = []
+
+# Set by SIGTERM/SIGINT in daemon mode
+_stop = threading.Event()
+
+# Bulk fetch pool (and its size), kept across cycles so the worker threads'
+# database and cache connections stay open
+_executor = None
+_executor_size = 0
+_executor_lock = threading.Lock()
+
+
+def check_all_watches(concurrency=None, cycle_timeout=None, worker_id=None, batch_size=None):
     """
     Check all active watches against Ticketmaster API.
+    Only events whose adaptive next-check time has passed (see scheduler.py)
+    are polled. Events are leased from the events table a batch at a time,
+    so several watcher processes (or hosts) can share it. Each event is
+    fetched once per cycle, many ids per request; its watches are only
+    loaded when the event's fingerprint (status, prices) changed and it
+    has tickets on sale. Bulk fetches run on a bounded thread pool;
+    evaluation, DB writes and alert sends stay on the calling thread as
+    each fetch completes.
     Send alerts when tickets match criteria.
     """
-    logger.info("=== Starting watch check ===")
+    concurrency = WATCHER_CONCURRENCY if concurrency is None else concurrency
+    cycle_timeout = WATCHER_CYCLE_TIMEOUT if cycle_timeout is None else cycle_timeout
+    worker_id = worker_id or default_worker_id()
+    batch_size = batch_size or WATCHER_LEASE_BATCH
+    started = time.monotonic()
+    deadline = started + cycle_timeout
+    cycle_start = datetime.now().isoformat()
+    logger.info(f"=== Starting watch check ({worker_id}, concurrency {concurrency}) ===")
+
+    stats = {"checked": 0, "events": 0, "changed": 0, "alerts": 0, "errors": 0}
+    while time.monotonic() < deadline and not _stop.is_set():
+        claimed = {row["event_id"]: row for row in claim_events(
+            worker_id, batch_size, WATCHER_LEASE_SECONDS, checked_before=cycle_start
+        )}
+        if not claimed:
+            break
+
+        watch_count = sum(row["watcher_count"] for row in claimed.values())
+        logger.info(f"Checking {len(claimed)} events ({watch_count} watches)")
+        stats["checked"] += watch_count
+        stats["events"] += len(claimed)
+
+        batch = CycleBatch()
+        changes = []
+        for event_id, event in _fetch_events(list(claimed), concurrency, deadline):
+            previous = claimed[event_id]
+            if event is _FAILED:
+                # Keep the lease: the event is retried once it expires
+                stats["errors"] += previous["watcher_count"]
+                continue
+
+            batch.event_checked(event_id)
+            fingerprint = event_fingerprint(event)
+            complete = True
+            # Same status and prices as last time: no watch can have changed outcome
+            # (new watches clear the fingerprint)
+            if fingerprint != previous["fingerprint"]:
+                stats["changed"] += 1
+                complete = _check_event_watches(event_id, event, stats, batch)
+                if previous["fingerprint"]:
+                    changes.append((event_id, previous["fingerprint"], fingerprint, event))
+
+            # An incomplete evaluation forgets the fingerprint so the next cycle re-checks everything
+            _reschedule(event_id, event, previous, fingerprint if complete else None, batch)
+            batch.release(worker_id, [event_id])
+        batch.flush()
+        _notify_changes(changes)
+
+    stats["duration_s"] = round(time.monotonic() - started, 3)
+    logger.info(f"=== Check complete: {stats['checked']} checked, {stats['alerts']} alerts, "
+                f"{stats['errors']} errors in {stats['duration_s']}s ===")
+    return stats
+
+
+def default_worker_id():
+    """Lease owner name for this process: host:pid."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _fetch_events(event_ids, concurrency, deadline):
+    """
+    Yield (event_id, event) pairs as bulk fetches complete.
+    Ids are fetched TM_BULK_BATCH_SIZE per request, with up to
+    `concurrency` requests in flight. Events that fail, or are still
+    outstanding at the deadline, yield _FAILED.
+    """
+    batches = list(id_batches(event_ids))
+    if concurrency <= 1:
+        for batch_ids in batches:
+            if time.monotonic() >= deadline:
+                logger.warning(f"Cycle timeout: skipping {len(batch_ids)} events")
+                found = {}
+            else:
+                found = _fetch_batch(batch_ids)
+            for event_id in batch_ids:
+                yield event_id, found.get(event_id, _FAILED)
+        return
+
+    executor = _fetch_executor(concurrency)
+    futures = {executor.submit(_fetch_batch, batch_ids): batch_ids for batch_ids in batches}
+    try:
+        for future in as_completed(futures, timeout=max(0, deadline - time.monotonic())):
+            found = future.result()
+            for event_id in futures.pop(future):
+                yield event_id, found.get(event_id, _FAILED)
+    except FuturesTimeout:
+        logger.warning(f"Cycle timeout: {len(futures)} bulk fetches still pending")
+        for batch_ids in futures.values():
+            for event_id in batch_ids:
+                yield event_id, _FAILED
+    finally:
+        # Drop queued fetches; stragglers already running are bounded by TM_CHECK_TIMEOUT
+        for future in futures:
+            future.cancel()
+
+
+def _fetch_executor(concurrency):
+    """The shared bulk fetch pool, replaced if the concurrency changes."""
+    global _executor, _executor_size
+    with _executor_lock:
+        if _executor is None or _executor_size != concurrency:
+            if _executor is not None:
+                _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="watcher")
+            _executor_size = concurrency
+        return _executor
 
-    watches = get_active_watches()
-    logger.info(f"Checking {len(watches)} active watches")
 
-    alerts_sent = 0
-    errors = 0
+def _shutdown_executor():
+    """Stop the bulk fetch pool, waiting for fetches already running."""
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=True, cancel_futures=True)
 
-    for watch in watches:
+
+def _fetch_batch(event_ids):
+    """Bulk-fetch events; ids missing from the result failed to fetch."""
+    try:
+        return get_events(event_ids, priority=PRIORITY_BACKGROUND, use_cache=False)
+    except Exception as e:
+        logger.error(f"Error fetching {len(event_ids)} events: {e}")
+        return {}
+
+
+def add_change_listener(callback):
+    """
+    Register callback(event_id, old_fingerprint, new_fingerprint, event),
+    called after each batch is persisted for every event whose status or
+    prices changed since it was last seen.
+    """
+    _change_listeners.append(callback)
+
+
+def _notify_changes(changes):
+    for event_id, old, new, event in changes:
+        logger.info(f"Event {event_id} changed: {old} -> {new}")
+        for callback in _change_listeners:
+            try:
+                callback(event_id, old, new, event)
+            except Exception as e:
+                logger.error(f"Change listener failed for {event_id}: {e}")
+
+
+def _reschedule(event_id, event, previous, fingerprint, batch):
+    """Work out when this event is next due and persist its observed state (and price history)."""
+    status = event.status if event else "not_found"
+    price = event.price_min if event else None
+    if PRICE_HISTORY_ENABLED:
+        batch.price_observed(event_id, status, price, event.price_max if event else None)
+
+    now = datetime.now()
+    last_change_at = previous.get("last_change_at")
+    if previous.get("fingerprint") and fingerprint and fingerprint != previous["fingerprint"]:
+        last_change_at = now.isoformat()
+
+    date_start = (event.date if event else None) or previous.get("date_start")
+    interval = compute_interval(date_start, previous.get("watcher_count", 1), last_change_at, now)
+    next_check = now.timestamp() + interval
+    batch.event_state(event_id, status, price, last_change_at,
+                      datetime.fromtimestamp(next_check).isoformat(), fingerprint)
+
+
+def _check_event_watches(event_id, event, stats, batch):
+    """
+    Evaluate the watches on one event against the fetched event.
+    Watches are only read from the database when the event has tickets on
+    sale, and only those whose max_price the current price meets.
+    Returns False if any watch errored or its alert couldn't be queued.
+    """
+    complete = True
+    for watch in _satisfied_watches(event_id, event):
         try:
-            check_single_watch(watch)
-            alerts_sent += 1
+            outcome = check_single_watch(watch, event, batch)
         except Exception as e:
             logger.error(f"Error checking watch {watch['id']}: {e}")
-            errors += 1
+            outcome = ALERT_FAILED
+            stats["errors"] += 1
+        if outcome == ALERT_SENT:
+            stats["alerts"] += 1
+        elif outcome == ALERT_FAILED:
+            complete = False
+    return complete
 
-    logger.info(f"=== Check complete: {alerts_sent} checked, {errors} errors ===")
-    return {"checked": len(watches), "alerts": alerts_sent, "errors": errors}
 
+def _satisfied_watches(event_id, event):
+    """Active watches on the event whose max_price its current minimum price meets."""
+    availability = evaluate_availability(event)
+    if not availability.get("available"):
+        return []
+    return get_event_watches(event_id, availability.get("price"))
 
-def check_single_watch(watch):
-    """Check a single watch for ticket availability."""
+
+def check_single_watch(watch, event=_FETCH, batch=None):
+    """
+    Check a single watch for ticket availability.
+    Pass an already-fetched event to avoid another API call, and a
+    CycleBatch to defer DB writes to the batch's flush.
+    Returns ALERT_SENT, ALERT_FAILED, or None when nothing matched.
+    """
     watch_id = watch["id"]
     user_id = watch["user_id"]
     event_id = watch["event_id"]
@@ -49,10 +274,13 @@ def check_single_watch(watch):
     logger.debug(f"Checking watch {watch_id}: {event_name}")
 
     # Check availability on Ticketmaster
-    result = check_availability(event_id, max_price, quantity)
+    if event is _FETCH:
+        event = get_event(event_id)
+    result = evaluate_availability(event, max_price, quantity)
 
-    # Update last_checked timestamp
-    update_watch_status(watch_id, "active", last_checked=datetime.now().isoformat())
+    # Update last_checked timestamp (a batch marks the whole event checked)
+    if batch is None:
+        update_watch_status(watch_id, "active", last_checked=datetime.now().isoformat())
 
     # If tickets are available at target price, send alert
     if result.get("available"):
@@ -62,61 +290,172 @@ def check_single_watch(watch):
         user = get_user(user_id)
         if not user:
             logger.error(f"User {user_id} not found")
-            return
-
-        # Send alert
-        alert_result = send_alert(
-            user_id=user_id,
-            phone=user.get("phone"),
-            event_name=event_name,
-            venue=watch.get("venue"),
-            date=watch.get("date_start"),
-            current_price=result.get("price"),
-            max_price=max_price,
-            quantity=quantity,
-            buy_url=watch.get("buy_url")
-        )
+            return ALERT_FAILED
 
-        if alert_result.get("success"):
-            # Record the alert
-            record_alert(watch_id, user_id, event_name, result.get("price"))
-            logger.info(f"Alert sent for watch {watch_id}")
+        # Record the alert and queue its message in the outbox together
+        message = format_alert_message(
+            event_name, watch.get("venue"), watch.get("date_start"), result.get("price"),
+            max_price, quantity, watch.get("buy_url")
+        )
+        if batch is not None:
+            batch.alert_sent(watch_id, user_id, event_name, result.get("price"), message)
         else:
-            logger.error(f"Failed to send alert for watch {watch_id}")
+            record_alert(watch_id, user_id, event_name, result.get("price"), message)
+        logger.info(f"Alert queued for watch {watch_id}")
+        return ALERT_SENT
     else:
         logger.debug(f"No match for watch {watch_id}: {result.get('details')}")
+    return None
+
+
+def run_daemon(worker_id=None, concurrency=None):
+    """
+    Stay resident and run watch cycles back to back.
+    Sleeps until the next event is due (bounded by DAEMON_MIN/MAX_SLEEP so
+    new watches are picked up quickly), keeps modules, logging and the
+    fetch threads (with their connections) warm between cycles, and runs
+    _maintain() every DAEMON_HOUSEKEEPING_INTERVAL.
+    SIGTERM/SIGINT finish the current batch and exit cleanly.
+    """
+    worker_id = worker_id or default_worker_id()
+    _stop.clear()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, _request_stop)
+
+    logger.info(f"Watcher daemon {worker_id} started")
+    checkpointer = start_checkpointer(_stop)
+    cycles = 0
+    next_maintenance = time.monotonic()
+    while not _stop.is_set():
+        try:
+            result = check_all_watches(concurrency=concurrency, worker_id=worker_id)
+            _print_result(result)
+        except Exception as e:
+            logger.error(f"Watch cycle failed: {e}", exc_info=True)
+        cycles += 1
+        if time.monotonic() >= next_maintenance:
+            next_maintenance = time.monotonic() + DAEMON_HOUSEKEEPING_INTERVAL
+            _maintain()
+        _stop.wait(_seconds_until_next_cycle())
+
+    _shutdown_executor()
+    if checkpointer is not None:
+        checkpointer.join(timeout=10)
+    logger.info(f"Watcher daemon {worker_id} stopped after {cycles} cycles")
+
+
+def _maintain():
+    """Daemon housekeeping: price history rollups and old outbox messages."""
+    if PRICE_HISTORY_ENABLED:
+        try:
+            price_history.maintain()
+        except Exception as e:
+            logger.error(f"Price history maintenance failed: {e}", exc_info=True)
+    try:
+        purged = purge_alert_outbox(ALERT_OUTBOX_KEEP_DAYS)
+        if purged:
+            logger.info(f"Purged {purged} old outbox messages")
+    except Exception as e:
+        logger.error(f"Outbox purge failed: {e}", exc_info=True)
+
+
+def _request_stop(signum, frame):
+    logger.info(f"Received signal {signum}, shutting down after current batch")
+    _stop.set()
+
+
+def _seconds_until_next_cycle():
+    """
+    Sleep time until the earliest due event, clamped to the daemon bounds.
+    Read from the events table, so it reflects every worker's checks and
+    ignores events nobody is watching any more. If the database can't be
+    read, waits DAEMON_MIN_SLEEP and lets the next cycle try again.
+    """
+    try:
+        next_check = get_next_check_at()
+    except Exception as e:
+        logger.error(f"Could not read the next due event: {e}", exc_info=True)
+        return DAEMON_MIN_SLEEP
+    wait = (datetime.fromisoformat(next_check).timestamp() - time.time()) if next_check else DAEMON_MAX_SLEEP
+    return max(DAEMON_MIN_SLEEP, min(DAEMON_MAX_SLEEP, wait))
+
+
+def _print_result(result):
+    """Output JSON for cron/journal logging."""
+    print(json.dumps({
+        "timestamp": datetime.now().isoformat(),
+        "status": "success",
+        "result": result
+    }), flush=True)
+
+
+class DailyLogHandler(logging.FileHandler):
+    """
+    Writes to <directory>/<prefix>-YYYY-MM-DD.log for the current local date,
+    moving to the next day's file at midnight, so a resident daemon logs
+    where `tail -f watcher-$(date +%Y-%m-%d).log` looks.
+    """
+
+    def __init__(self, directory, prefix):
+        self.directory = directory
+        self.prefix = prefix
+        self.date = datetime.now().strftime("%Y-%m-%d")
+        super().__init__(self._path())
+
+    def _path(self):
+        return self.directory / f"{self.prefix}-{self.date}.log"
+
+    def emit(self, record):
+        today = datetime.fromtimestamp(record.created).strftime("%Y-%m-%d")
+        if today > self.date:
+            self.acquire()
+            try:
+                if today > self.date:
+                    self.date = today
+                    self.baseFilename = os.path.abspath(self._path())
+                    if self.stream:
+                        self.stream.close()
+                        self.stream = None  # Reopened on the new file by FileHandler.emit
+            finally:
+                self.release()
+        super().emit(record)
 
 
 def main():
-    """Entry point for cron job."""
+    """Entry point for cron job (or --daemon for a resident watcher)."""
     import sys
+    import argparse
     from config import CHECK_INTERVAL_MINUTES, LOG_LEVEL, LOG_FORMAT
     from pathlib import Path
 
+    parser = argparse.ArgumentParser(description="TicketWatch watcher")
+    parser.add_argument("--daemon", action="store_true", help="Stay resident and loop on the schedule")
+    parser.add_argument("--worker-id", default=None, help="Lease owner name (default host:pid)")
+    parser.add_argument("--concurrency", type=int, default=None, help="Parallel event fetches")
+    args = parser.parse_args()
+
     # Setup logging
-    log_file = Path.home() / "ticketwatch" / "logs" / f"watcher-{datetime.now().strftime('%Y-%m-%d')}.log"
-    log_file.parent.mkdir(parents=True, exist_ok=True)
+    log_dir = Path.home() / "ticketwatch" / "logs"
+    log_dir.mkdir(parents=True, exist_ok=True)
 
     logging.basicConfig(
         level=LOG_LEVEL,
         format=LOG_FORMAT,
         handlers=[
-            logging.FileHandler(log_file),
+            DailyLogHandler(log_dir, "watcher"),
             logging.StreamHandler(sys.stdout)
         ]
     )
 
+    if args.daemon:
+        run_daemon(worker_id=args.worker_id, concurrency=args.concurrency)
+        return
+
     logger.info(f"Check interval: {CHECK_INTERVAL_MINUTES} minutes")
 
     # Run the check
-    result = check_all_watches()
-
-    # Output JSON for cron logging
-    print(json.dumps({
-        "timestamp": datetime.now().isoformat(),
-        "status": "success",
-        "result": result
-    }))
+    result = check_all_watches(concurrency=args.concurrency, worker_id=args.worker_id)
+    _print_result(result)
 
 
 if __name__ == "__main__":